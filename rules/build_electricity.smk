@@ -266,14 +266,30 @@ def input_ua_md_availability_matrix(w):
     return {}
 
 
-rule build_renewable_profiles:
+# Settings of the land-use exclusions, changing them triggers a recomputation
+# of the availability matrix
+AVAILABILITY_MATRIX_SETTINGS = [
+    "natura",
+    "corine",
+    "luisa",
+    "excluder_resolution",
+    "ship_threshold",
+    "max_depth",
+    "min_shore_distance",
+    "max_shore_distance",
+]
+
+
+def availability_matrix_settings(w):
+    settings = config_provider("renewable", w.technology)(w)
+    return {k: v for k, v in settings.items() if k in AVAILABILITY_MATRIX_SETTINGS}
+
+
+rule determine_availability_matrix:
     params:
-        snapshots=config_provider("snapshots"),
-        drop_leap_day=config_provider("enable", "drop_leap_day"),
-        renewable=config_provider("renewable"),
+        renewable=availability_matrix_settings,
     input:
         unpack(input_ua_md_availability_matrix),
-        base_network=resources("networks/base.nc"),
         corine=ancient("data/bundle/corine/g250_clc06_V18_5.tif"),
         natura=lambda w: (
             resources("natura.tiff")
@@ -298,6 +314,41 @@ rule build_renewable_profiles:
             else []
         ),
         country_shapes=resources("country_shapes.geojson"),
+        regions=lambda w: (
+            resources("regions_onshore.geojson")
+            if w.technology in ("onwind", "solar")
+            else resources("regions_offshore.geojson")
+        ),
+        cutout=lambda w: "cutouts/"
+        + CDIR
+        + config_provider("renewable", w.technology, "cutout")(w)
+        + ".nc",
+    output:
+        resources("availability_matrix_{technology}.nc"),
+    log:
+        logs("determine_availability_matrix_{technology}.log"),
+    benchmark:
+        benchmarks("determine_availability_matrix_{technology}")
+    threads: config["atlite"].get("nprocesses", 4)
+    resources:
+        mem_mb=config["atlite"].get("nprocesses", 4) * 5000,
+    wildcard_constraints:
+        # Any technology other than hydro, not matching the MD-UA matrices
+        technology="(?!hydro|MD-UA).*",
+    conda:
+        "../envs/environment.yaml"
+    script:
+        "../scripts/determine_availability_matrix.py"
+
+
+rule build_renewable_profiles:
+    params:
+        snapshots=config_provider("snapshots"),
+        drop_leap_day=config_provider("enable", "drop_leap_day"),
+        renewable=config_provider("renewable"),
+    input:
+        availability_matrix=resources("availability_matrix_{technology}.nc"),
+        base_network=resources("networks/base.nc"),
         offshore_shapes=resources("offshore_shapes.geojson"),
         regions=lambda w: (
             resources("regions_onshore.geojson")
@@ -577,6 +628,7 @@ rule add_extra_components:
 rule prepare_network:
     params:
         time_resolution=config_provider("clustering", "temporal", "resolution_elec"),
+        segmentation_cache=resources("segmentation_cache"),
         links=config_provider("links"),
         lines=config_provider("lines"),
         co2base=config_provider("electricity", "co2base"),
@@ -146,29 +146,6 @@ def heat_demand_cutout(wildcards):
         return "cutouts/" + CDIR + c + ".nc"
 
 
-rule build_daily_heat_demand:
-    params:
-        snapshots=config_provider("snapshots"),
-        drop_leap_day=config_provider("enable", "drop_leap_day"),
-    input:
-        pop_layout=resources("pop_layout_{scope}.nc"),
-        regions_onshore=resources("regions_onshore_elec_s{simpl}_{clusters}.geojson"),
-        cutout=heat_demand_cutout,
-    output:
-        heat_demand=resources("daily_heat_demand_{scope}_elec_s{simpl}_{clusters}.nc"),
-    resources:
-        mem_mb=20000,
-    threads: 8
-    log:
-        logs("build_daily_heat_demand_{scope}_{simpl}_{clusters}.loc"),
-    benchmark:
-        benchmarks("build_daily_heat_demand/{scope}_s{simpl}_{clusters}")
-    conda:
-        "../envs/environment.yaml"
-    script:
-        "../scripts/build_daily_heat_demand.py"
-
-
 rule build_hourly_heat_demand:
     params:
         snapshots=config_provider("snapshots"),
@@ -191,59 +168,6 @@ rule build_hourly_heat_demand:
         "../scripts/build_hourly_heat_demand.py"
 
 
-rule build_temperature_profiles:
-    params:
-        snapshots=config_provider("snapshots"),
-        drop_leap_day=config_provider("enable", "drop_leap_day"),
-    input:
-        pop_layout=resources("pop_layout_{scope}.nc"),
-        regions_onshore=resources("regions_onshore_elec_s{simpl}_{clusters}.geojson"),
-        cutout=heat_demand_cutout,
-    output:
-        temp_soil=resources("temp_soil_{scope}_elec_s{simpl}_{clusters}.nc"),
-        temp_air=resources("temp_air_{scope}_elec_s{simpl}_{clusters}.nc"),
-    resources:
-        mem_mb=20000,
-    threads: 8
-    log:
-        logs("build_temperature_profiles_{scope}_{simpl}_{clusters}.log"),
-    benchmark:
-        benchmarks("build_temperature_profiles/{scope}_s{simpl}_{clusters}")
-    conda:
-        "../envs/environment.yaml"
-    script:
-        "../scripts/build_temperature_profiles.py"
-
-
-rule build_cop_profiles:
-    params:
-        heat_pump_sink_T=config_provider("sector", "heat_pump_sink_T"),
-    input:
-        temp_soil_total=resources("temp_soil_total_elec_s{simpl}_{clusters}.nc"),
-        temp_soil_rural=resources("temp_soil_rural_elec_s{simpl}_{clusters}.nc"),
-        temp_soil_urban=resources("temp_soil_urban_elec_s{simpl}_{clusters}.nc"),
-        temp_air_total=resources("temp_air_total_elec_s{simpl}_{clusters}.nc"),
-        temp_air_rural=resources("temp_air_rural_elec_s{simpl}_{clusters}.nc"),
-        temp_air_urban=resources("temp_air_urban_elec_s{simpl}_{clusters}.nc"),
-    output:
-        cop_soil_total=resources("cop_soil_total_elec_s{simpl}_{clusters}.nc"),
-        cop_soil_rural=resources("cop_soil_rural_elec_s{simpl}_{clusters}.nc"),
-        cop_soil_urban=resources("cop_soil_urban_elec_s{simpl}_{clusters}.nc"),
-        cop_air_total=resources("cop_air_total_elec_s{simpl}_{clusters}.nc"),
-        cop_air_rural=resources("cop_air_rural_elec_s{simpl}_{clusters}.nc"),
-        cop_air_urban=resources("cop_air_urban_elec_s{simpl}_{clusters}.nc"),
-    resources:
-        mem_mb=20000,
-    log:
-        logs("build_cop_profiles_s{simpl}_{clusters}.log"),
-    benchmark:
-        benchmarks("build_cop_profiles/s{simpl}_{clusters}")
-    conda:
-        "../envs/environment.yaml"
-    script:
-        "../scripts/build_cop_profiles.py"
-
-
 def solar_thermal_cutout(wildcards):
     c = config_provider("solar_thermal", "cutout")(wildcards)
     if c == "default":
@@ -257,28 +181,45 @@ def solar_thermal_cutout(wildcards):
         return "cutouts/" + CDIR + c + ".nc"
 
 
-rule build_solar_thermal_profiles:
+rule build_clustered_weather:
     params:
         snapshots=config_provider("snapshots"),
         drop_leap_day=config_provider("enable", "drop_leap_day"),
         solar_thermal=config_provider("solar_thermal"),
+        heat_pump_sink_T=config_provider("sector", "heat_pump_sink_T"),
     input:
-        pop_layout=resources("pop_layout_{scope}.nc"),
+        pop_layout_total=resources("pop_layout_total.nc"),
+        pop_layout_urban=resources("pop_layout_urban.nc"),
+        pop_layout_rural=resources("pop_layout_rural.nc"),
         regions_onshore=resources("regions_onshore_elec_s{simpl}_{clusters}.geojson"),
-        cutout=solar_thermal_cutout,
+        cutout=heat_demand_cutout,
+        solar_thermal_cutout=solar_thermal_cutout,
     output:
-        solar_thermal=resources("solar_thermal_{scope}_elec_s{simpl}_{clusters}.nc"),
+        **{
+            f"{name}_{scope}": resources(
+                f"{prefix}_{scope}_elec_s{{simpl}}_{{clusters}}.nc"
+            )
+            for name, prefix in [
+                ("temp_air", "temp_air"),
+                ("temp_soil", "temp_soil"),
+                ("heat_demand", "daily_heat_demand"),
+                ("solar_thermal", "solar_thermal"),
+                ("cop_air", "cop_air"),
+                ("cop_soil", "cop_soil"),
+            ]
+            for scope in ["total", "urban", "rural"]
+        },
     resources:
         mem_mb=20000,
-    threads: 16
+    threads: 8
     log:
-        logs("build_solar_thermal_profiles_{scope}_s{simpl}_{clusters}.log"),
+        logs("build_clustered_weather_s{simpl}_{clusters}.log"),
     benchmark:
-        benchmarks("build_solar_thermal_profiles/{scope}_s{simpl}_{clusters}")
+        benchmarks("build_clustered_weather/s{simpl}_{clusters}")
     conda:
         "../envs/environment.yaml"
     script:
-        "../scripts/build_solar_thermal_profiles.py"
+        "../scripts/build_clustered_weather.py"
 
 
 rule build_energy_totals:
@@ -770,6 +711,8 @@ rule build_shipping_demand:
 
 
 rule build_existing_car_ages:
+    params:
+        cache_dir=resources("acea_cache"),
     input:
         ACEA_report=storage(
             "https://www.acea.auto/files/ACEA-Report-Vehicles-on-European-roads-.pdf",
@@ -800,6 +743,7 @@ rule build_transport_demand:
         drop_leap_day=config_provider("enable", "drop_leap_day"),
         sector=config_provider("sector"),
         energy_totals_year=config_provider("energy", "energy_totals_year"),
+        export_csv=config_provider("sector", "transport_profiles_csv", default=False),
     input:
         clustered_pop_layout=resources("pop_layout_elec_s{simpl}_{clusters}.csv"),
         pop_weighted_energy_totals=resources(
@@ -811,10 +755,10 @@ rule build_transport_demand:
         traffic_data_Lkw="data/bundle-sector/emobility/Lkw__count",
         temp_air_total=resources("temp_air_total_elec_s{simpl}_{clusters}.nc"),
     output:
-        transport_demand=resources("transport_demand_s{simpl}_{clusters}.csv"),
+        transport_demand=resources("transport_demand_s{simpl}_{clusters}.nc"),
         transport_data=resources("transport_data_s{simpl}_{clusters}.csv"),
-        avail_profile=resources("avail_profile_s{simpl}_{clusters}.csv"),
-        dsm_profile=resources("dsm_profile_s{simpl}_{clusters}.csv"),
+        avail_profile=resources("avail_profile_s{simpl}_{clusters}.nc"),
+        dsm_profile=resources("dsm_profile_s{simpl}_{clusters}.nc"),
         car_registration=resources("car_registration_s{simpl}_{clusters}.csv"),
     threads: 1
     resources:
@@ -827,6 +771,28 @@ rule build_transport_demand:
         "../scripts/build_transport_demand.py"
 
 
+rule build_vehicle_stock:
+    params:
+        planning_horizons=config_provider("scenario", "planning_horizons"),
+        car_reg_factor=config_provider("sector", "car_reg_factor", default=1.0),
+    input:
+        car_ages=resources("car_ages.csv"),
+        truck_ages=resources("truck_ages.csv"),
+        car_registration=resources("car_registration_s{simpl}_{clusters}.csv"),
+        clustered_pop_layout=resources("pop_layout_elec_s{simpl}_{clusters}.csv"),
+    output:
+        resources("vehicle_stock_s{simpl}_{clusters}.nc"),
+    threads: 1
+    resources:
+        mem_mb=1000,
+    log:
+        logs("build_vehicle_stock_s{simpl}_{clusters}.log"),
+    conda:
+        "../envs/environment.yaml"
+    script:
+        "../scripts/build_vehicle_stock.py"
+
+
 rule build_district_heat_share:
     params:
         sector=config_provider("sector"),
@@ -895,6 +861,7 @@ def input_profile_offwind(w):
 rule prepare_sector_network:
     params:
         time_resolution=config_provider("clustering", "temporal", "resolution_sector"),
+        segmentation_cache=resources("segmentation_cache"),
         drop_leap_day=config_provider("enable", "drop_leap_day"),
         co2_budget=config_provider("co2_budget"),
         conventional_carriers=config_provider(
@@ -911,9 +878,11 @@ rule prepare_sector_network:
         countries=config_provider("countries"),
         adjustments=config_provider("adjustments", "sector"),
         emissions_scope=config_provider("energy", "emissions"),
+        transport_sweep_base_sector=transport_sweep_base_sector,
         RDIR=RDIR,
     input:
         unpack(input_profile_offwind),
+        unpack(input_transport_sweep_base),
         **rules.cluster_gas_network.output,
         **rules.build_gas_input_locations.output,
         retro_cost=lambda w: (
@@ -948,10 +917,10 @@ rule prepare_sector_network:
             "pop_weighted_heat_totals_s{simpl}_{clusters}.csv"
         ),
         shipping_demand=resources("shipping_demand_s{simpl}_{clusters}.csv"),
-        transport_demand=resources("transport_demand_s{simpl}_{clusters}.csv"),
+        transport_demand=resources("transport_demand_s{simpl}_{clusters}.nc"),
         transport_data=resources("transport_data_s{simpl}_{clusters}.csv"),
-        avail_profile=resources("avail_profile_s{simpl}_{clusters}.csv"),
-        dsm_profile=resources("dsm_profile_s{simpl}_{clusters}.csv"),
+        avail_profile=resources("avail_profile_s{simpl}_{clusters}.nc"),
+        dsm_profile=resources("dsm_profile_s{simpl}_{clusters}.nc"),
         co2_totals_name=resources("co2_totals.csv"),
         co2="data/bundle-sector/eea/UNFCCC_v23.csv",
         biomass_potentials=lambda w: (
@@ -1013,6 +982,8 @@ rule prepare_sector_network:
     output:
         RESULTS
         + "prenetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
+        stages=RESULTS
+        + "prenetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}_stages.json",
     threads: 1
     resources:
         mem_mb=2000,
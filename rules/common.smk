@@ -10,7 +10,13 @@ import os, sys, glob
 path = workflow.source_path("../scripts/_helpers.py")
 sys.path.insert(0, os.path.dirname(path))
 
-from _helpers import validate_checksum, update_config_from_wildcards
+from _helpers import (
+    validate_checksum,
+    update_config_from_wildcards,
+    read_solve_benchmarks,
+    fit_solve_resources,
+    predict_solve_resources,
+)
 from snakemake.utils import update_config
 
 
@@ -105,6 +111,56 @@ def memory(w):
         return int(factor * (10000 + 195 * int(w.clusters)))
 
 
+@lru_cache
+def solve_resource_models(results_dir, min_observations):
+    """Fit resource models on the solved sector networks in ``results_dir``."""
+    return fit_solve_resources(read_solve_benchmarks(results_dir), min_observations)
+
+
+def predicted_solve_resources(w, input):
+    settings = config_provider("solving", "predict_resources", default={})(w)
+    if not settings.get("enable", False) or not os.path.exists(input.network):
+        return None
+    # all scenarios of the run share the models
+    results_dir = RESULTS.split("{run}")[0]
+    coefficients = solve_resource_models(
+        results_dir, settings.get("min_observations", 10)
+    )
+    if coefficients is None:
+        return None
+    prediction = predict_solve_resources(input.network, coefficients)
+    factor = settings.get("safety_factor", 1.2)
+    return {k: v * factor for k, v in prediction.items()}
+
+
+def solve_memory(wildcards, input, attempt):
+    """
+    Predict the peak memory of a solve rule from the dimensions of its input
+    network. Falls back to ``solving: mem_mb`` if the prediction is disabled
+    or there are too few benchmarks.
+    """
+    prediction = predicted_solve_resources(wildcards, input)
+    if prediction is None:
+        return config_provider("solving", "mem_mb")(wildcards)
+    return int(max(prediction["mem_mb"], 1000) * attempt)
+
+
+def solve_runtime(default):
+    """
+    Predict the runtime of a solve rule from the dimensions of its input
+    network. Falls back to ``solving: runtime`` if the prediction is disabled
+    or there are too few benchmarks.
+    """
+
+    def runtime(wildcards, input, attempt):
+        prediction = predicted_solve_resources(wildcards, input)
+        if prediction is None:
+            return config_provider("solving", "runtime", default=default)(wildcards)
+        return int(max(prediction["runtime"] / 60, 10) * attempt)
+
+    return runtime
+
+
 def input_custom_extra_functionality(w):
     path = config_provider(
         "solving", "options", "custom_extra_functionality", default=False
@@ -114,6 +170,87 @@ def input_custom_extra_functionality(w):
     return []
 
 
+# sector options which only affect the land transport and shipping demand
+TRANSPORT_SWEEP_OPTIONS = [
+    "transport_sweep",
+    "endogenous_transport",
+    "transport_slack",
+    "bev_dsm_restriction_value",
+    "bev_dsm_restriction_time",
+    "transport_heating_deadband_upper",
+    "transport_heating_deadband_lower",
+    "ICE_lower_degree_factor",
+    "ICE_upper_degree_factor",
+    "EV_lower_degree_factor",
+    "EV_upper_degree_factor",
+    "bev_dsm",
+    "bev_availability",
+    "bev_energy",
+    "bev_charge_efficiency",
+    "bev_plug_to_wheel_efficiency",
+    "bev_charge_rate",
+    "bev_avail_max",
+    "bev_avail_mean",
+    "transport_profiles_csv",
+    "v2g",
+    "land_transport_fuel_cell_share",
+    "land_transport_electric_share",
+    "land_transport_ice_share",
+    "transport_electric_efficiency",
+    "transport_fuel_cell_efficiency",
+    "transport_ice_efficiency",
+    "car_reg_factor",
+    "ship_reg_factor",
+    "vary_demand",
+    "no_pmaxpu",
+]
+
+
+@lru_cache
+def transport_sweep_base(run):
+    """Return the base scenario whose prenetworks are patched for a run."""
+    sweep = scenario_config(run)["sector"].get("transport_sweep", {})
+    base = sweep.get("base")
+    if not sweep.get("enable", False) or not base or base == run:
+        return None
+    if base not in scenarios:
+        raise ValueError(f"Transport sweep base scenario {base} not found.")
+
+    def without_transport(c):
+        c = copy.deepcopy(c)
+        for key in TRANSPORT_SWEEP_OPTIONS:
+            c["sector"].pop(key, None)
+        return c
+
+    if without_transport(scenario_config(run)) != without_transport(
+        scenario_config(base)
+    ):
+        raise ValueError(
+            f"Scenario {run} differs from the transport sweep base scenario {base} "
+            "in more than the land transport and shipping demand options."
+        )
+    return base
+
+
+def input_transport_sweep_base(w):
+    base = transport_sweep_base(w.run) if "run" in w.keys() else None
+    if base is None:
+        return {}
+    return {
+        "base_network": RESULTS.replace("{run}", base)
+        + f"prenetworks/elec_s{w.simpl}_{w.clusters}_l{w.ll}_{w.opts}_{w.sector_opts}_{w.planning_horizons}.nc"
+    }
+
+
+def transport_sweep_base_sector(w):
+    base = transport_sweep_base(w.run) if "run" in w.keys() else None
+    if base is None:
+        return {}
+    return update_config_from_wildcards(scenario_config(base), w, inplace=False)[
+        "sector"
+    ]
+
+
 # Check if the workflow has access to the internet by trying to access the HEAD of specified url
 def has_internet_access(url="www.zenodo.org") -> bool:
     import http.client as http_client
@@ -137,7 +274,7 @@ def solved_previous_horizon(w):
 
     return (
         RESULTS
-        + "postnetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_"
+        + "brownfield_state/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_"
         + planning_horizon_p
         + ".nc"
     )
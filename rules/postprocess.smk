@@ -147,6 +147,7 @@ rule make_summary:
         drop_leap_day=config_provider("enable", "drop_leap_day"),
         scenario=config_provider("scenario"),
         RDIR=RDIR,
+        summary_cache=RESULTS + "csvs/summary_cache",
     input:
         networks=expand(
             RESULTS
@@ -210,9 +211,9 @@ rule make_summary:
         market_values=RESULTS + "csvs/market_values.csv",
         price_statistics=RESULTS + "csvs/price_statistics.csv",
         metrics=RESULTS + "csvs/metrics.csv",
-    threads: 2
+    threads: 4
     resources:
-        mem_mb=10000,
+        mem_mb=20000,
     log:
         RESULTS + "logs/make_summary.log",
     conda:
@@ -221,6 +222,72 @@ rule make_summary:
         "../scripts/make_summary.py"
 
 
+rule build_summary_store:
+    input:
+        **{
+            metric: RESULTS + f"csvs/{metric}.csv"
+            for metric in [
+                "nodal_costs",
+                "nodal_capacities",
+                "nodal_cfs",
+                "cfs",
+                "costs",
+                "capacities",
+                "curtailment",
+                "energy",
+                "supply",
+                "supply_energy",
+                "prices",
+                "weighted_prices",
+                "price_statistics",
+                "market_values",
+                "metrics",
+            ]
+        },
+    output:
+        directory(RESULTS + "summary_store"),
+    threads: 1
+    resources:
+        mem_mb=4000,
+    log:
+        RESULTS + "logs/build_summary_store.log",
+    conda:
+        "../envs/environment.yaml"
+    script:
+        "../scripts/build_summary_store.py"
+
+
+COMPARISON = (
+    "results/"
+    + (config["run"]["prefix"] + "/" if config["run"].get("prefix") else "")
+    + "comparison/"
+)
+
+
+rule make_summary_scenarios:
+    params:
+        plotting=config["plotting"],
+        carriers=config["plotting"]["scenario_comparison_carriers"],
+    input:
+        stores=expand(RESULTS + "summary_store", run=config["run"]["name"]),
+    output:
+        costs=COMPARISON + "costs.pdf",
+        **{
+            f"supply_energy_share_{carrier.replace(' ', '_')}": COMPARISON
+            + f"supply_energy_share_{carrier.replace(' ', '_')}.pdf"
+            for carrier in config["plotting"]["scenario_comparison_carriers"]
+        },
+    threads: 1
+    resources:
+        mem_mb=4000,
+    log:
+        COMPARISON + "logs/make_summary_scenarios.log",
+    conda:
+        "../envs/environment.yaml"
+    script:
+        "../scripts/make_summary_scenarios.py"
+
+
 rule plot_summary:
     params:
         countries=config_provider("countries"),
@@ -24,6 +24,8 @@ rule solve_network:
         ),
         python=RESULTS
         + "logs/solve_network/elec_s{simpl}_{clusters}_ec_l{ll}_{opts}_python.log",
+        attempts=RESULTS
+        + "logs/solve_network/elec_s{simpl}_{clusters}_ec_l{ll}_{opts}_attempts.json",
     benchmark:
         (RESULTS + "benchmarks/solve_network/elec_s{simpl}_{clusters}_ec_l{ll}_{opts}")
     threads: solver_threads
@@ -40,7 +42,8 @@ rule solve_network:
 
 rule solve_operations_network:
     params:
-        options=config_provider("solving", "options"),
+        solving=config_provider("solving"),
+        custom_extra_functionality=input_custom_extra_functionality,
     input:
         network=RESULTS + "networks/elec_s{simpl}_{clusters}_ec_l{ll}_{opts}.nc",
     output:
@@ -57,7 +60,7 @@ rule solve_operations_network:
             RESULTS
             + "benchmarks/solve_operations_network/elec_s{simpl}_{clusters}_ec_l{ll}_{opts}"
         )
-    threads: 4
+    threads: config_provider("solving", "operations", "processes", default=4)
     resources:
         mem_mb=(lambda w: 10000 + 372 * int(w.clusters)),
         runtime=config_provider("solving", "runtime", default="6h"),
@@ -10,9 +10,7 @@ rule add_existing_baseyear:
         existing_capacities=config_provider("existing_capacities"),
         costs=config_provider("costs"),
     input:
-        car_ages=resources("car_ages.csv"),
-        car_registration=resources("car_registration_s{simpl}_{clusters}.csv"),
-        truck_ages=resources("truck_ages.csv"),
+        vehicle_stock=resources("vehicle_stock_s{simpl}_{clusters}.nc"),
         network=RESULTS
         + "prenetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
         powerplants=resources("powerplants.csv"),
@@ -78,12 +76,11 @@ rule add_brownfield:
         carriers=config_provider("electricity", "renewable_carriers"),
     input:
         unpack(input_profile_tech_brownfield),
-        car_registration=resources("car_registration_s{simpl}_{clusters}.csv"),
         simplify_busmap=resources("busmap_elec_s{simpl}.csv"),
         cluster_busmap=resources("busmap_elec_s{simpl}_{clusters}.csv"),
         network=RESULTS
         + "prenetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
-        network_p=solved_previous_horizon,  #solved network at previous time step
+        network_p=solved_previous_horizon,  #brownfield state of solved network at previous time step
         costs=resources("costs_{planning_horizons}.csv"),
         cop_soil_total=resources("cop_soil_total_elec_s{simpl}_{clusters}.nc"),
         cop_air_total=resources("cop_air_total_elec_s{simpl}_{clusters}.nc"),
@@ -128,6 +125,8 @@ rule solve_sector_network_myopic:
         + "postnetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
         config=RESULTS
         + "configs/config.elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.yaml",
+        brownfield=RESULTS
+        + "brownfield_state/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
     shadow:
         "shallow"
     log:
@@ -135,12 +134,14 @@ rule solve_sector_network_myopic:
         + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}_solver.log",
         memory=RESULTS
         + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}_memory.log",
+        attempts=RESULTS
+        + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}_attempts.json",
         python=RESULTS
         + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}_python.log",
     threads: solver_threads
     resources:
-        mem_mb=config_provider("solving", "mem_mb"),
-        runtime=config_provider("solving", "runtime", default="6h"),
+        mem_mb=solve_memory,
+        runtime=solve_runtime("6h"),
     benchmark:
         (
             RESULTS
@@ -152,6 +153,34 @@ rule solve_sector_network_myopic:
         "../scripts/solve_network.py"
 
 
+rule report_model_size:
+    params:
+        solving=config_provider("solving"),
+        foresight=config_provider("foresight"),
+        planning_horizons=config_provider("scenario", "planning_horizons"),
+        co2_sequestration_potential=config_provider(
+            "sector", "co2_sequestration_potential", default=200
+        ),
+        custom_extra_functionality=input_custom_extra_functionality,
+    input:
+        network=RESULTS
+        + "prenetworks-brownfield/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
+        costs=resources("costs_{planning_horizons}.csv"),
+    output:
+        model_size=RESULTS
+        + "model_size/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.json",
+    log:
+        python=RESULTS
+        + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}_model_size.log",
+    threads: 1
+    resources:
+        mem_mb=solve_memory,
+    conda:
+        "../envs/environment.yaml"
+    script:
+        "../scripts/solve_network.py"
+
+
 #
 # rule copy_config:
 #     output:
@@ -8,8 +8,7 @@ rule add_existing_baseyear:
         existing_capacities=config_provider("existing_capacities"),
         costs=config_provider("costs"),
     input:
-        car_ages=resources("car_ages.csv"),
-        truck_ages=resources("truck_ages.csv"),
+        vehicle_stock=resources("vehicle_stock_s{simpl}_{clusters}.nc"),
         network=RESULTS
         + "prenetworks/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_{planning_horizons}.nc",
         powerplants=resources("powerplants.csv"),
@@ -66,6 +65,7 @@ rule prepare_perfect_foresight:
     params:
         costs=config_provider("costs"),
         time_resolution=config_provider("clustering", "temporal", "sector"),
+        segmentation_cache=resources("segmentation_cache"),
     input:
         unpack(input_network_year),
         brownfield_network=lambda w: (
@@ -117,8 +117,8 @@ rule solve_sector_network_perfect:
         + "configs/config.elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years.yaml",
     threads: solver_threads
     resources:
-        mem_mb=config_provider("solving", "mem_mb"),
-        runtime=config_provider("solving", "runtime", default="24h"),
+        mem_mb=solve_memory,
+        runtime=solve_runtime("24h"),
     shadow:
         "shallow"
     log:
@@ -128,6 +128,8 @@ rule solve_sector_network_perfect:
         + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years_python.log",
         memory=RESULTS
         + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years_memory.log",
+        attempts=RESULTS
+        + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years_attempts.json",
     benchmark:
         (
             RESULTS
@@ -139,6 +141,35 @@ rule solve_sector_network_perfect:
         "../scripts/solve_network.py"
 
 
+rule report_model_size:
+    params:
+        solving=config_provider("solving"),
+        foresight=config_provider("foresight"),
+        sector=config_provider("sector"),
+        planning_horizons=config_provider("scenario", "planning_horizons"),
+        co2_sequestration_potential=config_provider(
+            "sector", "co2_sequestration_potential", default=200
+        ),
+        custom_extra_functionality=input_custom_extra_functionality,
+    input:
+        network=RESULTS
+        + "prenetworks-brownfield/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years.nc",
+        costs=resources("costs_2030.csv"),
+    output:
+        model_size=RESULTS
+        + "model_size/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years.json",
+    log:
+        python=RESULTS
+        + "logs/elec_s{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}_brownfield_all_years_model_size.log",
+    threads: 1
+    resources:
+        mem_mb=solve_memory,
+    conda:
+        "../envs/environment.yaml"
+    script:
+        "../scripts/solve_network.py"
+
+
 def input_networks_make_summary_perfect(w):
     return {
         f"networks_{simpl}_{clusters}_l{ll}_{opts}_{sector_opts}": RESULTS
@@ -254,3 +254,93 @@ class optional(object):
         if self.variable:
             return self.contextman.__exit__(exc_type, exc_val, exc_tb)
         return False
+
+
+class stage_profiler(object):
+    """
+    Record wall time, peak memory increase and the change in the number of
+    components for consecutive stages of building a network.
+
+    Each stage is measured with a :class:`timer` and a :class:`memory_logger`.
+    The records can be written to a JSON file with :meth:`to_json`.
+
+    Parameters
+    ----------
+    interval : float
+        Interval between memory measurements in seconds (defaults to 0.1)
+
+    Example
+    -------
+    profile = stage_profiler()
+
+    with profile("add_heat", n):
+        add_heat(n, costs)
+
+    # stages which return a new network have to pass it on
+    with profile("set_temporal_aggregation", n) as stage:
+        n = set_temporal_aggregation(n, resolution, solver_name)
+        stage.n = n
+
+    profile.to_json("stages.json")
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.records = []
+
+    def __call__(self, name, n):
+        return _stage(self, name, n)
+
+    def to_json(self, filename):
+        import json
+
+        with open(filename, "w") as f:
+            json.dump(self.records, f, indent=2)
+
+
+class _stage(object):
+    def __init__(self, profiler, name, n):
+        self.profiler = profiler
+        self.name = name
+        self.n = n
+
+    @staticmethod
+    def count_components(n):
+        return {c.name: len(c.df) for c in n.iterate_components()}
+
+    def __enter__(self):
+        self.counts = self.count_components(self.n)
+        self.mem = memory_logger(interval=self.profiler.interval, max_usage=False)
+        self.mem.__enter__()
+        self.time = timer(self.name, verbose=False)
+        self.time.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.time.__exit__(exc_type, exc_val, exc_tb)
+        self.mem.__exit__(exc_type, exc_val, exc_tb)
+        if exc_type is not None:
+            return False
+
+        # first measurement is the baseline at the start of the stage
+        mem_usage = [mem for mem, _ in self.mem.mem_usage]
+        counts = self.count_components(self.n)
+        changes = {
+            c: counts.get(c, 0) - self.counts.get(c, 0)
+            for c in counts.keys() | self.counts.keys()
+            if counts.get(c, 0) != self.counts.get(c, 0)
+        }
+        record = dict(
+            stage=self.name,
+            wall_time=self.time.usec / 1e6,
+            peak_memory_increase=max(mem_usage) - mem_usage[0],
+            component_changes=dict(sorted(changes.items())),
+        )
+        self.profiler.records.append(record)
+
+        logger.info(
+            f"Stage {self.name} took {record['wall_time']:.1f}s, increased peak "
+            f"memory by {record['peak_memory_increase']:.0f} MiB and changed the "
+            f"number of components by {sum(changes.values())}."
+        )
+        return False
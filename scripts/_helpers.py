@@ -5,6 +5,7 @@
 
 import contextlib
 import copy
+import glob
 import hashlib
 import logging
 import os
@@ -15,6 +16,7 @@ from os.path import exists
 from pathlib import Path
 from shutil import copyfile
 
+import numpy as np
 import pandas as pd
 import pytz
 import requests
@@ -497,22 +499,156 @@ def generate_periodic_profiles(dt_index, nodes, weekly_profile, localize=None):
     Give a 24*7 long list of weekly hourly profiles, generate this for each
     country for the period dt_index, taking account of time zones and summer
     time.
+
+    The hour-of-week index is computed once per distinct time zone and
+    broadcast to all nodes sharing that time zone. Returns float32
+    values.
     """
-    weekly_profile = pd.Series(weekly_profile, range(24 * 7))
+    weekly_profile = np.asarray(weekly_profile, dtype=np.float32)
+    assert weekly_profile.shape == (24 * 7,), "Weekly profile must have 168 values."
+
+    nodes = pd.Index(nodes)
+    countries = nodes.str[:2]
+    timezones = pd.Series(
+        {ct: pytz.country_timezones[ct][0] for ct in countries.unique()}
+    )
+    node_timezones = timezones.reindex(countries).values
 
-    week_df = pd.DataFrame(index=dt_index, columns=nodes)
+    week_values = np.empty((len(dt_index), len(nodes)), dtype=np.float32)
+    for timezone in pd.unique(node_timezones):
+        tz_dt_index = dt_index.tz_convert(pytz.timezone(timezone))
+        hour_of_week = 24 * tz_dt_index.weekday.values + tz_dt_index.hour.values
+        columns = np.flatnonzero(node_timezones == timezone)
+        week_values[:, columns] = weekly_profile[hour_of_week][:, np.newaxis]
 
-    for node in nodes:
-        timezone = pytz.timezone(pytz.country_timezones[node[:2]][0])
-        tz_dt_index = dt_index.tz_convert(timezone)
-        week_df[node] = [24 * dt.weekday() + dt.hour for dt in tz_dt_index]
-        week_df[node] = week_df[node].map(weekly_profile)
+    week_df = pd.DataFrame(week_values, index=dt_index, columns=nodes)
 
     week_df = week_df.tz_localize(localize)
 
     return week_df
 
 
+def get_time_series_matrix(n, attrs=None, exclude_attrs=()):
+    """
+    Collect the non-empty time-dependent data of a network in a single float32
+    DataFrame with columns ``(component, key, asset)``.
+
+    Parameters
+    ----------
+    n : pypsa.Network
+    attrs : dict, optional
+        Mapping of component names to the time-dependent attributes to
+        collect. Defaults to all components and attributes.
+    exclude_attrs : list-like, optional
+        Time-dependent attributes to skip.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    blocks = []
+    for c in n.iterate_components(attrs.keys() if attrs is not None else None):
+        for attr, pnl in c.pnl.items():
+            if pnl.empty or attr in exclude_attrs:
+                continue
+            if attrs is not None and attr not in attrs[c.name]:
+                continue
+            blocks.append((c.name, attr, pnl))
+
+    ncols = sum(pnl.shape[1] for _, _, pnl in blocks)
+    values = np.empty((len(n.snapshots), ncols), dtype=np.float32)
+    component, key, asset = [], [], []
+    i = 0
+    for c, attr, pnl in blocks:
+        values[:, i : i + pnl.shape[1]] = pnl.reindex(n.snapshots).values
+        i += pnl.shape[1]
+        component.extend([c] * pnl.shape[1])
+        key.extend([attr] * pnl.shape[1])
+        asset.extend(pnl.columns)
+
+    columns = pd.MultiIndex.from_arrays(
+        [component, key, asset], names=["component", "key", "asset"]
+    )
+    return pd.DataFrame(values, index=n.snapshots, columns=columns)
+
+
+def segment_time_series(raw, segments, solver_name="cbc", cache_dir=None):
+    """
+    Aggregate time series to segments with different lengths using tsam.
+
+    The segment durations are cached in ``cache_dir`` keyed by a hash of the
+    normalised time series and the number of segments, so that identical
+    inputs reuse the segmentation instead of recomputing it.
+
+    Parameters
+    ----------
+    raw : pd.DataFrame
+        Hourly time series with snapshots as index.
+    segments : int
+        Number of segments.
+    solver_name : str
+        Name of the solver passed to tsam.
+    cache_dir : str, optional
+        Directory of the segmentation cache. No caching if None.
+
+    Returns
+    -------
+    weightings : pd.Series
+        Duration of each segment in hours indexed by the first snapshot of
+        the segment.
+    segmented : pd.DataFrame
+        Average of ``raw`` over each segment.
+    """
+    normed = (raw / raw.max().replace(0, 1)).astype(np.float32)
+
+    fn = None
+    if cache_dir is not None:
+        hasher = hashlib.sha256()
+        hasher.update(np.ascontiguousarray(normed.values).tobytes())
+        hasher.update(f"{normed.shape}-{int(segments)}".encode())
+        fn = Path(cache_dir) / f"segments_{hasher.hexdigest()}.csv"
+
+    if fn is not None and fn.exists():
+        logger.info(f"Reuse cached segmentation from {fn}.")
+        durations = pd.read_csv(fn)["duration"].values
+    else:
+        try:
+            import tsam.timeseriesaggregation as tsam
+        except ImportError:
+            raise ModuleNotFoundError(
+                "Optional dependency 'tsam' not found." "Install via 'pip install tsam'"
+            )
+
+        agg = tsam.TimeSeriesAggregation(
+            normed,
+            hoursPerPeriod=len(normed),
+            noTypicalPeriods=1,
+            noSegments=int(segments),
+            segmentation=True,
+            solver=solver_name,
+        )
+        segmented = agg.createTypicalPeriods()
+        durations = segmented.index.get_level_values("Segment Duration").values
+
+        if fn is not None:
+            fn.parent.mkdir(parents=True, exist_ok=True)
+            pd.Series(durations, name="duration").to_csv(fn, index=False)
+
+    offsets = np.insert(np.cumsum(durations[:-1]), 0, 0)
+    snapshots = pd.DatetimeIndex(
+        [raw.index[0] + pd.Timedelta(f"{offset}h") for offset in offsets]
+    )
+    weightings = pd.Series(
+        durations, index=snapshots, name="weightings", dtype="float64"
+    )
+
+    # tsam represents a segment of a single typical period by its average
+    segment_i = np.repeat(np.arange(len(durations)), durations)
+    segmented = raw.groupby(segment_i).mean().set_axis(snapshots)
+
+    return weightings, segmented
+
+
 def parse(infix):
     """
     Recursively parse a chained wildcard expression into a dictionary or a YAML
@@ -761,16 +897,35 @@ def validate_checksum(file_path, zenodo_url=None, checksum=None):
     if zenodo_url:
         checksum = get_checksum_from_zenodo(zenodo_url)
     hash_type, checksum = checksum.split(":")
-    hasher = hashlib.new(hash_type)
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(65536), b""):  # 64kb chunks
-            hasher.update(chunk)
-    calculated_checksum = hasher.hexdigest()
+    calculated_checksum = get_file_hash(file_path, hash_type)
     assert (
         calculated_checksum == checksum
     ), "Checksum is invalid. This may be due to an incomplete download. Delete the file and re-execute the rule."
 
 
+def get_file_hash(file_path, hash_type="sha256"):
+    """
+    Calculate the hash of a file's content in chunks.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    hash_type : str, optional
+        Hash algorithm known to ``hashlib``. Defaults to "sha256".
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the file content.
+    """
+    hasher = hashlib.new(hash_type)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):  # 1MB chunks
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 def get_snapshots(snapshots, drop_leap_day=False, freq="h", **kwargs):
     """
     Returns pandas DateTimeIndex potentially without leap days.
@@ -781,3 +936,251 @@ def get_snapshots(snapshots, drop_leap_day=False, freq="h", **kwargs):
         time = time[~((time.month == 2) & (time.day == 29))]
 
     return time
+
+
+def deduplicate_time_series(ds):
+    """
+    Store identical time series of a network dataset only once.
+
+    For each time-dependent attribute (e.g. ``links_t_p_max_pu``), columns
+    identical to a previous column are dropped. The reference table
+    ``dedup_{list_name}_t_{attr}`` maps the names of the dropped components
+    to the component whose series is kept. Use :func:`expand_time_series`
+    to restore the dataset.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Network dataset as returned by ``pypsa.Network.export_to_netcdf``.
+
+    Returns
+    -------
+    xr.Dataset
+    """
+    import xarray as xr
+
+    for var in list(ds.data_vars):
+        dim = f"{var}_i"
+        da = ds[var]
+        if var.startswith("dedup_") or "_t_" not in var or dim not in da.dims:
+            continue
+
+        values = np.ascontiguousarray(da.transpose(dim, ...).values)
+        hashes = pd.Index(
+            [hashlib.blake2b(v.tobytes(), digest_size=16).digest() for v in values]
+        )
+        duplicated = hashes.duplicated()
+        if not duplicated.any():
+            continue
+
+        names = da.indexes[dim]
+        kept = pd.Series(names[~duplicated], index=hashes[~duplicated])
+        references = xr.DataArray(
+            kept[hashes[duplicated]].values,
+            coords={f"dedup_{dim}": names[duplicated].values},
+            dims=f"dedup_{dim}",
+        )
+
+        ds = ds.drop_vars([var, dim])
+        ds[var] = da.isel({dim: np.flatnonzero(~duplicated)})
+        ds[f"dedup_{var}"] = references
+
+    return ds
+
+
+def expand_time_series(ds):
+    """
+    Restore the time series of a network dataset deduplicated by
+    :func:`deduplicate_time_series`.
+
+    The copies are selected lazily from the kept series, so the dataset
+    is only loaded into memory when the network is imported.
+    """
+    import xarray as xr
+
+    for ref in [v for v in ds.data_vars if v.startswith("dedup_")]:
+        var = ref[len("dedup_") :]
+        dim = f"{var}_i"
+        references = ds[ref].to_pandas()
+        da = ds[var]
+        copies = da.sel({dim: references.values}).assign_coords(
+            {dim: references.index.values}
+        )
+        ds = ds.drop_vars([var, dim, ref, f"{ref}_i"])
+        ds[var] = xr.concat([da, copies], dim=dim)
+
+    return ds
+
+
+def export_network(n, fn, deduplicate=True):
+    """
+    Export a network to netCDF, storing time series shared by several
+    components only once.
+
+    Networks written with ``deduplicate=True`` must be read with
+    :func:`load_network`. Reading them with plain ``pypsa.Network(fn)``
+    silently drops the deduplicated time series, so that the affected
+    components fall back to their static values.
+    """
+    ds = n.export_to_netcdf()
+    if deduplicate:
+        ds = deduplicate_time_series(ds)
+        n_refs = sum(ds.sizes[f"{v}_i"] for v in ds.data_vars if v.startswith("dedup_"))
+        logger.info(f"Store {n_refs} duplicate time series as references.")
+    ds.to_netcdf(fn)
+
+
+def load_network(fn):
+    """
+    Load a network from netCDF, restoring time series deduplicated by
+    :func:`export_network`.
+    """
+    import pypsa
+    import xarray as xr
+
+    n = pypsa.Network()
+    with xr.open_dataset(fn) as ds:
+        n.import_from_netcdf(expand_time_series(ds))
+    return n
+
+
+SOLVE_RESOURCE_COMPONENTS = [
+    "buses",
+    "generators",
+    "links",
+    "stores",
+    "storage_units",
+    "lines",
+]
+
+
+def get_network_dimensions(fn):
+    """
+    Read the number of snapshots and components of a network stored as netCDF
+    without loading the network.
+
+    Parameters
+    ----------
+    fn : str
+        Path to the network file.
+
+    Returns
+    -------
+    dict
+        Number of snapshots and of each component in
+        ``SOLVE_RESOURCE_COMPONENTS``.
+    """
+    import xarray as xr
+
+    with xr.open_dataset(fn) as ds:
+        sizes = dict(ds.sizes)
+
+    dims = {c: sizes.get(f"{c}_i", 0) for c in SOLVE_RESOURCE_COMPONENTS}
+    dims["snapshots"] = sizes.get("snapshots", 0)
+    return dims
+
+
+def read_solve_benchmarks(results_dir="results"):
+    """
+    Collect the peak memory and runtime of previously solved sector networks.
+
+    Uses the benchmark files and memory logs written by the solve rules and
+    reads the model dimensions from the corresponding input networks, so
+    that the models are fitted on the same networks they predict from.
+
+    Parameters
+    ----------
+    results_dir : str
+        Directory which is searched recursively for benchmark files.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per solved network with the model dimensions, the peak
+        memory ``mem_mb`` and the wall time ``runtime`` in seconds.
+    """
+    records = {}
+    pattern = os.path.join(results_dir, "**", "benchmarks", "solve_sector_network", "*")
+    for fn in glob.glob(pattern, recursive=True):
+        name = os.path.basename(fn).rstrip("}")
+        root = Path(fn).parents[2]
+        # input network of the solve rule, brownfield for myopic and perfect
+        for folder in ["prenetworks-brownfield", "prenetworks"]:
+            network = root / folder / f"{name}.nc"
+            if network.exists():
+                break
+        else:
+            continue
+
+        benchmark = pd.read_csv(fn, sep="\t")
+        mem_mb = benchmark["max_rss"].max()
+
+        memory_log = root / "logs" / f"{name}_memory.log"
+        if memory_log.exists():
+            mem_log = pd.read_csv(memory_log, sep=" ", header=None, usecols=[1])
+            mem_mb = np.nanmax([mem_mb, mem_log[1].max()])
+
+        records[str(network)] = dict(
+            get_network_dimensions(network),
+            mem_mb=mem_mb,
+            runtime=benchmark["s"].max(),
+        )
+
+    columns = SOLVE_RESOURCE_COMPONENTS + ["snapshots", "mem_mb", "runtime"]
+    return pd.DataFrame.from_dict(records, orient="index", columns=columns).dropna()
+
+
+def solve_resource_features(dims):
+    """
+    Features of the resource model: an intercept and the number of each
+    component multiplied with the number of snapshots, which is proportional
+    to the number of variables and constraints.
+    """
+    dims = pd.DataFrame(dims)
+    features = dims[SOLVE_RESOURCE_COMPONENTS].mul(dims["snapshots"], axis=0)
+    features.insert(0, "intercept", 1.0)
+    return features
+
+
+def fit_solve_resources(benchmarks, min_observations=10):
+    """
+    Fit non-negative linear models for peak memory and runtime of solving a
+    network from its dimensions.
+
+    Parameters
+    ----------
+    benchmarks : pd.DataFrame
+        Observations as returned by :func:`read_solve_benchmarks`.
+    min_observations : int
+        Minimal number of observations needed to fit the models.
+
+    Returns
+    -------
+    dict or None
+        Coefficients for ``mem_mb`` and ``runtime`` as pd.Series, or None if
+        there are too few observations.
+    """
+    from scipy.optimize import nnls
+
+    if len(benchmarks) < min_observations:
+        return None
+
+    features = solve_resource_features(benchmarks)
+    return {
+        target: pd.Series(
+            nnls(features.values, benchmarks[target].values)[0], features.columns
+        )
+        for target in ["mem_mb", "runtime"]
+    }
+
+
+def predict_solve_resources(fn, coefficients):
+    """
+    Predict peak memory in MB and runtime in seconds of solving the network
+    stored in ``fn`` with the models from :func:`fit_solve_resources`.
+    """
+    features = solve_resource_features([get_network_dimensions(fn)])
+    return {
+        target: float(features.iloc[0] @ coefficients[target])
+        for target in ["mem_mb", "runtime"]
+    }
@@ -14,7 +14,9 @@ import pypsa
 import xarray as xr
 from _helpers import (
     configure_logging,
+    export_network,
     get_snapshots,
+    load_network,
     set_scenario_config,
     update_config_from_wildcards,
 )
@@ -25,6 +27,100 @@ logger = logging.getLogger(__name__)
 idx = pd.IndexSlice
 
 
+def get_series_references(n, c, attr, year, assets_i):
+    """
+    Find time series of assets which are identical to the time series of the
+    asset of the same technology built in ``year``.
+
+    Returns the names of the assets built in ``year``, whose time series are
+    stored in place of the identical ones.
+    """
+    pnl = n.pnl(c)[attr]
+    assets_i = assets_i.intersection(pnl.columns)
+    base = assets_i.str.extract(r"^(.*)-\d{4}$", expand=False)
+    template = base + f"-{year}"
+    has_template = template.isin(assets_i) & (template != assets_i)
+    assets_i, template = assets_i[has_template], template[has_template]
+    identical = np.isclose(
+        pnl[assets_i].values, pnl[template].values, equal_nan=True
+    ).all(axis=0)
+    return pd.Series(template[identical], index=assets_i[identical])
+
+
+def restore_series_references(n, c):
+    """
+    Restore the time series of a brownfield state which refer to the time
+    series of another asset in the state.
+    """
+    df = n.df(c)
+    for col in df.columns[df.columns.str.endswith("_reference")]:
+        tattr = col.removesuffix("_reference")
+        references = df[col].fillna("")
+        references = references[references != ""]
+        pnl = n.pnl(c)[tattr]
+        missing = ~references.isin(pnl.columns)
+        if missing.any():
+            raise ValueError(
+                f"Time series '{tattr}' of {c} {references.index[missing].tolist()} "
+                f"refer to time series {references[missing].unique().tolist()}, "
+                "which are missing in the brownfield state."
+            )
+        n.import_series_from_dataframe(
+            pnl[references].set_axis(references.index, axis=1), c, tattr
+        )
+
+
+def export_brownfield_state(n, fn, year, renewable_carriers=[]):
+    """
+    Export a compact brownfield state of a solved network for the next planning
+    horizon.
+
+    The state holds the static data of buses, lines, links, generators and
+    stores.
+    Input time series are only kept for assets which can be carried over. Time
+    series identical to those of the asset of the same technology built in
+    ``year`` are not stored; instead, the column ``{attr}_reference`` refers
+    to that asset, whose time series is stored in the state. Renewable
+    profiles are always stored since they are adjusted per planning horizon.
+    """
+    logger.info(f"Exporting brownfield state to {fn}")
+
+    n_s = pypsa.Network()
+    n_s.set_snapshots(n.snapshots)
+    n_s.snapshot_weightings = n.snapshot_weightings
+
+    n_s.import_components_from_dataframe(n.buses, "Bus")
+    n_s.import_components_from_dataframe(n.lines, "Line")
+    for c in ["Link", "Generator", "Store"]:
+        df = n.df(c)
+        n_s.import_components_from_dataframe(df, c)
+
+        # assets tracking CO2 or global EU values are not carried over
+        tracking = (df.lifetime == np.inf) & ~df.index.str.contains("existing")
+        assets_i = df.index[~tracking]
+
+        selection = n.component_attrs[c].type.str.contains(
+            "series"
+        ) & n.component_attrs[c].status.str.contains("Input")
+        for tattr in n.component_attrs[c].index[selection]:
+            pnl = n.pnl(c)[tattr]
+            if pnl.empty:
+                continue
+            referable_i = assets_i
+            if c == "Generator" and tattr == "p_max_pu":
+                renewable_i = df.index[df.carrier.isin(renewable_carriers)]
+                referable_i = referable_i.difference(renewable_i)
+            references = get_series_references(n, c, tattr, year, referable_i)
+            if not references.empty:
+                n_s.df(c)[f"{tattr}_reference"] = references.reindex(
+                    n_s.df(c).index, fill_value=""
+                )
+            to_store = pnl.columns.intersection(assets_i).difference(references.index)
+            n_s.import_series_from_dataframe(pnl[to_store], c, tattr)
+
+    export_network(n_s, fn)
+
+
 def add_brownfield(n, n_p, year):
     logger.info(f"Preparing brownfield for the year {year}")
 
@@ -36,6 +132,9 @@ def add_brownfield(n, n_p, year):
     for c in n_p.iterate_components(["Link", "Generator", "Store"]):
         attr = "e" if c.name == "Store" else "p"
 
+        # before any referenced asset is removed
+        restore_series_references(n_p, c.name)
+
         # first, remove generators, links and stores that track
         # CO2 or global EU values since these are already in n
         n_p.mremove(c.name, c.df.index[(c.df.lifetime == np.inf) &
@@ -77,9 +176,9 @@ def add_brownfield(n, n_p, year):
         # copy over assets but fix their capacity
         c.df[f"{attr}_nom"] = c.df[f"{attr}_nom_opt"]
         c.df[f"{attr}_nom_extendable"] = False
-        
 
-        n.import_components_from_dataframe(c.df, c.name)
+        reference_cols = c.df.columns[c.df.columns.str.endswith("_reference")]
+        n.import_components_from_dataframe(c.df.drop(columns=reference_cols), c.name)
 
         # copy time-dependent
         selection = n.component_attrs[c.name].type.str.contains(
@@ -232,31 +331,9 @@ def adjust_renewable_profiles(n, input_profiles, params, year):
 
 
 def adjust_transport(n, ref_year=2024):
-    registrations = pd.read_csv(snakemake.input.car_registration, index_col=[0,1])
-    for transport_type in ["light", "heavy"]:
-        filter_links = (~n.links.p_nom_extendable & (n.links.lifetime==np.inf)
-                        & (n.links.carrier == f"land transport oil {transport_type}"))
-        links_i = n.links[filter_links].index
-        
-        factor = options["car_reg_factor"]
-        reg = registrations.loc[transport_type].iloc[:,0] * factor
-        
-        unchanged_fleet = (1-(reg*(year-ref_year))).clip(lower=0)
-        previous_year = n_p.links.build_year.max()
-        already_reduced =  (1-(reg*(previous_year-ref_year))).clip(lower=0)
-        changed = (unchanged_fleet/already_reduced.replace(0,1)).rename(index= lambda x: x + f" land transport oil {transport_type}-existing")
-        n.links.loc[links_i, "p_nom"] = (n.links.loc[links_i, "p_nom"] * changed).fillna(0)
-        
-        # final = {}
-        # for year in [2025, 2030, 2040, 2050]:
-        #     unchanged_fleet = (1-(reg*(year-ref_year))).clip(lower=0)
-        #     already_reduced =  (1-(reg*(previous_year-ref_year))).clip(lower=0)
-        #     changed = (unchanged_fleet/already_reduced.replace(0,1)).rename(index= lambda x: x + f" land transport oil {transport_type}-existing")
-        #     final[year] = (n.links.loc[links_i, "p_nom"] * changed).fillna(0)
-        #     previous_year = year
-                
-            
-        
+    # the existing land transport fleet retires by the lifetime of its
+    # cohorts, see add_existing_baseyear.add_existing_land_transport
+
     # remove very small capacity
     logger.info("Removing small land transport capacities")
     carriers = ['land transport EV heavy', 'land transport fuel cell heavy',
@@ -319,13 +396,13 @@ if __name__ == "__main__":
     
     options = snakemake.params.sector
     
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
 
     adjust_renewable_profiles(n, snakemake.input, snakemake.params, year)
 
     add_build_year_to_new_assets(n, year)
 
-    n_p = pypsa.Network(snakemake.input.network_p)
+    n_p = load_network(snakemake.input.network_p)
 
     add_brownfield(n, n_p, year)
 
@@ -335,4 +412,4 @@ if __name__ == "__main__":
         adjust_transport(n)
 
     n.meta = dict(snakemake.config, **dict(wildcards=dict(snakemake.wildcards)))
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0])
@@ -13,10 +13,11 @@ from types import SimpleNamespace
 import country_converter as coco
 import numpy as np
 import pandas as pd
-import pypsa
 import xarray as xr
 from _helpers import (
     configure_logging,
+    export_network,
+    load_network,
     set_scenario_config,
     update_config_from_wildcards,
 )
@@ -593,103 +594,50 @@ def add_heating_capacities_installed_before_baseyear(
             )
 
 
-def add_existing_land_transport2(baseyear, options, ref_year=2024):
-    transport_types = options["land_transport_ice_share"].keys()
-    registrations = pd.read_csv(snakemake.input.car_registration, index_col=[0,1])
-    for transport_type in transport_types:
-        
-        factor = options["car_reg_factor"]
-        reg = registrations.loc[transport_type].iloc[:,0] * factor
-        
+def add_existing_land_transport(baseyear, options, stock):
+    """
+    Add the existing fleet of internal combustion vehicles.
+
+    The fleet is split into cohorts by the planning horizon until which the
+    vehicles survive according to the vehicle ``stock``. The lifetime of each
+    cohort ends at the following planning horizon, so that its retirement is
+    consistent for myopic and perfect foresight. Vehicles surviving the last
+    planning horizon have an infinite lifetime.
+    """
+    surviving = stock.sel(engine="ice").sum("vintage")
+    horizons = surviving.horizon.values
+    for transport_type in surviving.transport_type.values:
         share = get(options["land_transport_ice_share"][transport_type], baseyear)
-        ice_i = n.links[n.links.carrier == f"land transport oil {transport_type}"].index
-        p_nom = n.links.loc[ice_i, "p_nom"] / share
+        suffix = f" land transport oil {transport_type}"
+        ice_i = n.links[n.links.carrier == suffix[1:]].index
+        nodes = ice_i.str.replace(f"{suffix}-{baseyear}", "")
+
+        # capacity of the total fleet of the reference year
+        p_nom = n.links.loc[ice_i, "p_nom"].values / share
+
+        shares = surviving.sel(transport_type=transport_type).to_pandas().reindex(nodes)
+        retired = shares - shares.shift(-1, axis=1).fillna(0)
+
         efficiency = n.links_t.efficiency[ice_i]
         p_min_pu = n.links_t.p_min_pu[ice_i]
-        
-        unchanged_fleet = 1-(reg*(baseyear-ref_year))
-        
-        df = n.links.loc[ice_i]
-       
-        df["build_year"] = 0
-        df["lifetime"] = np.inf
-        df["p_nom"] = p_nom.mul(unchanged_fleet.values)
-        df["p_nom_extendable"] = False
-        df.rename(
-            index=lambda x: x.replace(f"-{baseyear}", "-existing"), inplace=True
-        )
-        p_min_pu = p_min_pu.rename(
-            columns=lambda x: x.replace(f"-{baseyear}", "-existing"))
         p_max_pu = get_as_dense(n, "Link", "p_max_pu")[ice_i]
-        p_max_pu = p_max_pu.rename(
-            columns=lambda x: x.replace(f"-{baseyear}", "-existing"))
-        eff = efficiency.rename(
-            columns=lambda x: x.replace(f"-{baseyear}", "-existing"))
-
-        n.madd(
-            "Link",
-            df.index,
-            bus0=df.bus0,
-            bus1=df.bus1,
-            bus2=df.bus2,
-            carrier=df.carrier,
-            efficiency=eff,
-            capital_cost=df.capital_cost,
-            marginal_cost=df.marginal_cost,
-            efficiency2=df.efficiency2,
-            p_nom_extendable=False,
-            p_nom=df.p_nom,
-            p_min_pu=p_min_pu,
-            p_max_pu=p_max_pu,
-            build_year=df.build_year,
-            lifetime=df.lifetime,
-        )
-        
-        n.links.loc[ice_i, "p_nom"] = 0
-    
-def add_existing_land_transport(baseyear, options):
-    transport_types = options["land_transport_ice_share"].keys()
-    fn_dict = {"light": snakemake.input.car_ages,
-               "heavy": snakemake.input.truck_ages}
-    for transport_type in transport_types:
-        # today ICE capacity assuming all internal combustion
-        share = get(options["land_transport_ice_share"][transport_type], baseyear)
-        ice_i = n.links[n.links.carrier == f"land transport oil {transport_type}"].index
-        p_nom = n.links.loc[ice_i, "p_nom"] / share
-        efficiency = n.links_t.efficiency[ice_i]
-        p_min_pu = n.links_t.p_min_pu[ice_i]
-    
-        car_ages = pd.read_csv(fn_dict[transport_type], index_col=[0]).iloc[:,:-2]
-        car_ages.columns = car_ages.columns.astype(int)
-        # group data in 5 years interval
-        interval = 5
-        # mapping forward (mapping backward would be year//5*5)
-        group_mapping = {year: year//interval*interval+4 for year in car_ages.columns}
-    
-        grouped = car_ages.T.groupby(group_mapping).sum().T
-    
-        pop_layout = pd.read_csv(snakemake.input.clustered_pop_layout, index_col=0)
-    
-        grouped = (grouped.reindex(pop_layout.ct)
-                   .fillna(grouped.mean()).set_index(pop_layout.index))
-    
-        for build_year in grouped.columns:
-            df = n.links.loc[ice_i]
-            df = df[df.lifetime + build_year > baseyear]
-            if df.empty:
+
+        for i, horizon in enumerate(horizons):
+            if i + 1 < len(horizons):
+                lifetime = horizons[i + 1] - baseyear
+                name = f"-existing-{horizons[i + 1]}"
+            else:
+                lifetime = np.inf
+                name = "-existing"
+
+            cohort = retired[horizon].values
+            links_i = ice_i[cohort > 0]
+            if links_i.empty:
                 continue
-            share = grouped[build_year]
-            df["build_year"] = build_year
-            df["p_nom"] = p_nom.mul(share.values)
-            df["p_nom_extendable"] = False
-            df.rename(
-                index=lambda x: x.replace(f"-{baseyear}", f"-{build_year}"), inplace=True
-            )
-            profile = p_min_pu.rename(
-                columns=lambda x: x.replace(f"-{baseyear}", f"-{build_year}"))
-            eff = efficiency.rename(
-                columns=lambda x: x.replace(f"-{baseyear}", f"-{build_year}"))
-    
+
+            rename = dict(zip(ice_i, nodes + suffix + name))
+            df = n.links.loc[links_i].rename(index=rename)
+
             n.madd(
                 "Link",
                 df.index,
@@ -697,20 +645,21 @@ def add_existing_land_transport(baseyear, options):
                 bus1=df.bus1,
                 bus2=df.bus2,
                 carrier=df.carrier,
-                efficiency=eff,
+                efficiency=efficiency[links_i].rename(columns=rename),
                 capital_cost=df.capital_cost,
                 marginal_cost=df.marginal_cost,
                 efficiency2=df.efficiency2,
                 p_nom_extendable=False,
-                p_nom=df.p_nom,
-                p_min_pu=profile,
-               # p_max_pu=profile,
-                build_year=df.build_year,
-                lifetime=df.lifetime,
+                p_nom=(p_nom * cohort)[cohort > 0],
+                p_min_pu=p_min_pu[links_i].rename(columns=rename),
+                p_max_pu=p_max_pu[links_i].rename(columns=rename),
+                build_year=baseyear,
+                lifetime=lifetime,
             )
 
         n.links.loc[ice_i, "p_nom"] = 0
-        
+
+
 def add_existing_shipping(baseyear, options):
     # assume all existing ships are diesel ships
     carrier = 'shipping oil'
@@ -756,7 +705,7 @@ if __name__ == "__main__":
 
     baseyear = snakemake.params.baseyear
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
 
     # define spatial resolution of carriers
     spatial = define_spatial(n.buses[n.buses.carrier == "AC"].index, options)
@@ -805,7 +754,8 @@ if __name__ == "__main__":
         cluster_heat_buses(n)
     
     if options["endogenous_transport"]:
-        add_existing_land_transport2(baseyear, options)
+        stock = xr.open_dataarray(snakemake.input.vehicle_stock)
+        add_existing_land_transport(baseyear, options, stock)
     if options["shipping_endogenous"]:
         add_existing_shipping(baseyear, options)
 
@@ -813,4 +763,4 @@ if __name__ == "__main__":
 
     sanitize_carriers(n, snakemake.config)
 
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0])
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: : 2020-2024 The PyPSA-Eur Authors
+#
+# SPDX-License-Identifier: MIT
+"""
+Build the weather-dependent time series of the heating sector per clustered
+model region in one pass over the cutout.
+
+The population-weighted aggregation matrices of all scopes (total, urban,
+rural) are computed once and stacked, so that each conversion aggregates to
+all scopes at once. The temperature and irradiation variables of the cutout
+are loaded once per month and shared by all conversions:
+
+- air and soil temperatures, weighted by the population share of each cell,
+- daily heat demand using the heating degree day (HDD) approximation,
+  weighted by the population of each cell,
+- solar thermal collector profiles, weighted by the population share of
+  each cell,
+- coefficients of performance (COP) of air- and ground-sourced heat pumps.
+
+The COP is a function of the temperature difference between source and
+sink. The quadratic regression used is based on Staffell et al. (2012)
+https://doi.org/10.1039/C2EE22653G.
+
+If the solar thermal profiles are configured to use a different cutout than
+the heat demand, that cutout is read in a second pass.
+
+Outputs
+-------
+
+- ``resources/temp_{air,soil}_{scope}_elec_s{simpl}_{clusters}.nc``
+- ``resources/daily_heat_demand_{scope}_elec_s{simpl}_{clusters}.nc``
+- ``resources/solar_thermal_{scope}_elec_s{simpl}_{clusters}.nc``
+- ``resources/cop_{air,soil}_{scope}_elec_s{simpl}_{clusters}.nc``
+"""
+
+import logging
+
+import atlite
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import xarray as xr
+from _helpers import configure_logging, get_snapshots, set_scenario_config
+from dask.distributed import Client, LocalCluster
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ["total", "urban", "rural"]
+
+# cutout features read by the conversions below
+FEATURES = ["temperature", "influx"]
+
+
+def coefficient_of_performance(delta_T, source="air"):
+    if source == "air":
+        return 6.81 - 0.121 * delta_T + 0.000630 * delta_T**2
+    elif source == "soil":
+        return 8.77 - 0.150 * delta_T + 0.000734 * delta_T**2
+    else:
+        raise NotImplementedError("'source' must be one of  ['air', 'soil']")
+
+
+def population_weighted_matrices(cutout, regions, pop_layouts):
+    """
+    Build the aggregation matrices from cutout cells to clustered regions,
+    stacked over scopes.
+
+    Returns
+    -------
+    M : np.ndarray
+        Population in the intersection of cells and regions.
+    M_tilde : np.ndarray
+        ``M`` normalised to the population of each region.
+    """
+    I = cutout.indicatormatrix(regions)  # noqa: E741
+
+    M, M_tilde = [], []
+    for pop_layout in pop_layouts:
+        stacked_pop = pop_layout.stack(spatial=("y", "x"))
+        M_scope = I.T.dot(np.diag(I.dot(stacked_pop)))
+
+        nonzero_sum = M_scope.sum(axis=0, keepdims=True)
+        nonzero_sum[nonzero_sum == 0.0] = 1.0
+
+        M.append(M_scope.T)
+        M_tilde.append((M_scope / nonzero_sum).T)
+
+    return np.vstack(M), np.vstack(M_tilde)
+
+
+def load_features(cutout, client):
+    """
+    Load the variables of the cutout needed for the conversions into memory.
+    """
+    features = cutout.prepared_features
+    variables = features[
+        features.index.get_level_values("feature").isin(FEATURES)
+    ].tolist()
+    cutout.data = cutout.data[variables].load(scheduler=client)
+    return cutout
+
+
+def convert_cutout(cutout, time, conversions, regions, pop_layouts, client):
+    """
+    Stream the cutout month by month and apply all conversions to each month.
+
+    Parameters
+    ----------
+    cutout : atlite.Cutout
+    time : pd.DatetimeIndex
+        Snapshots to convert.
+    conversions : dict
+        Functions ``f(cutout, M, M_tilde, index)`` returning an aggregated
+        time series, keyed by the name of the output.
+    regions : gpd.GeoSeries
+        Clustered onshore regions.
+    pop_layouts : list of xr.DataArray
+        Population layouts of the scopes in ``SCOPES``.
+
+    Returns
+    -------
+    dict of xr.DataArray
+        Time series with a dimension ``scope``.
+    """
+    cutout = cutout.sel(time=time)
+    M, M_tilde = population_weighted_matrices(cutout, regions, pop_layouts)
+
+    # aggregate to all scopes at once with a unique index and split afterwards
+    index = pd.RangeIndex(len(SCOPES) * len(regions), name="name")
+
+    results = {name: [] for name in conversions}
+    months = time.to_period("M")
+    for month in months.unique():
+        logger.info(f"Convert cutout for {month}.")
+        chunk = load_features(cutout.sel(time=time[months == month]), client)
+        for name, convert in conversions.items():
+            results[name].append(convert(chunk, M, M_tilde, index))
+
+    for name, da in results.items():
+        da = xr.concat(da, dim="time")
+        da = xr.concat(
+            [
+                da.isel(
+                    name=slice(i * len(regions), (i + 1) * len(regions))
+                ).assign_coords(name=regions.index)
+                for i in range(len(SCOPES))
+            ],
+            dim=xr.DataArray(SCOPES, dims="scope", name="scope"),
+        )
+        results[name] = da
+
+    return results
+
+
+if __name__ == "__main__":
+    if "snakemake" not in globals():
+        from _helpers import mock_snakemake
+
+        snakemake = mock_snakemake(
+            "build_clustered_weather",
+            simpl="",
+            clusters=48,
+        )
+    configure_logging(snakemake)
+    set_scenario_config(snakemake)
+
+    nprocesses = int(snakemake.threads)
+    cluster = LocalCluster(n_workers=nprocesses, threads_per_worker=1)
+    client = Client(cluster, asynchronous=True)
+
+    time = get_snapshots(snakemake.params.snapshots, snakemake.params.drop_leap_day)
+    daily = get_snapshots(
+        snakemake.params.snapshots,
+        snakemake.params.drop_leap_day,
+        freq="D",
+    )
+
+    clustered_regions = (
+        gpd.read_file(snakemake.input.regions_onshore).set_index("name").buffer(0)
+    )
+    pop_layouts = [
+        xr.open_dataarray(snakemake.input[f"pop_layout_{scope}"]) for scope in SCOPES
+    ]
+
+    solar_thermal_config = snakemake.params.solar_thermal
+    solar_thermal_config.pop("cutout", None)
+
+    kwargs = dict(dask_kwargs=dict(scheduler=client), show_progress=False)
+    conversions = {
+        "temp_air": lambda c, M, M_tilde, index: c.temperature(
+            matrix=M_tilde, index=index, **kwargs
+        ),
+        "temp_soil": lambda c, M, M_tilde, index: c.soil_temperature(
+            matrix=M_tilde, index=index, **kwargs
+        ),
+        "heat_demand": lambda c, M, M_tilde, index: c.heat_demand(
+            matrix=M, index=index, **kwargs
+        ),
+    }
+    solar_thermal_conversion = {
+        "solar_thermal": lambda c, M, M_tilde, index: c.solar_thermal(
+            **solar_thermal_config, matrix=M_tilde, index=index, **kwargs
+        ),
+    }
+
+    if snakemake.input.solar_thermal_cutout == snakemake.input.cutout:
+        conversions |= solar_thermal_conversion
+        cutouts = {snakemake.input.cutout: conversions}
+    else:
+        cutouts = {
+            snakemake.input.cutout: conversions,
+            snakemake.input.solar_thermal_cutout: solar_thermal_conversion,
+        }
+
+    profiles = {}
+    for fn, cutout_conversions in cutouts.items():
+        profiles |= convert_cutout(
+            atlite.Cutout(fn),
+            time,
+            cutout_conversions,
+            clustered_regions,
+            pop_layouts,
+            client,
+        )
+
+    profiles["heat_demand"] = profiles["heat_demand"].sel(time=daily)
+
+    for source in ["air", "soil"]:
+        delta_T = snakemake.params.heat_pump_sink_T - profiles[f"temp_{source}"]
+        profiles[f"cop_{source}"] = coefficient_of_performance(delta_T, source)
+
+    for name, da in profiles.items():
+        for scope in SCOPES:
+            da.sel(scope=scope, drop=True).to_netcdf(
+                snakemake.output[f"{name}_{scope}"]
+            )
@@ -7,52 +7,88 @@ Read in existing car and truck ages from ACEA report (2024)
 """
 
 
-import tabula
-import numpy as np
+import logging
+import os
+
 import country_converter as coco
+import numpy as np
 import pandas as pd
-import logging
+from _helpers import configure_logging, get_file_hash, set_scenario_config
+
 logger = logging.getLogger(__name__)
-from _helpers import configure_logging, set_scenario_config
-
-def distirbute_cars(row):   
-    if row.name=="EU": return row
-    i = 0
-    for j, number in enumerate(row): 
-        if np.isnan(number):
-            i += 1
-        else:
-            distributed = number / (i+1)
-            row.iloc[j-i:j+1] = distributed
-            i = 0
-    return row
-
-def distribute_older_ages(ds, number_of_years=8):
-    "Distribute columne <10 years based on averaged data"
-    share_last_year = ds.fillna(0).loc['>10 years']
-    ds.drop('>10 years', inplace=True)
-    mean = ds.fillna(0).mean()
-    # convert index to int
-    ds.index = ds.index.astype(int)
-    years_i = np.arange(2012, 2012-number_of_years, -1)
-    av = share_last_year/mean
-    distributed = pd.Series(data=0, index=years_i, dtype="float64")
-    for i, year in enumerate(years_i): 
-        if i+1 < av:
-            distributed[year] = mean
-        elif (i == int(av)):
-            distributed[year] = (av - i)  * mean
-        else:
-            distributed[year] = 0
-        
-    if share_last_year - distributed.iloc[:-1].sum()> mean:
-        distributed.iloc[-1] = share_last_year - distributed.iloc[:-1].sum()
-        
-    return pd.concat([ds, distributed])
-
-def read_ages_from_pdf(fn, page, name="CARS BY AGE"):
-    tables = tabula.read_pdf(fn, pages=page)
-    table = tables[0]
+
+
+def read_pdf_table(fn, page, cache_dir=None):
+    """
+    Read the first table on a page of a PDF with tabula.
+
+    The raw table is cached by the checksum of the PDF, so that tabula only
+    runs again if the report changes.
+    """
+    if cache_dir is not None:
+        checksum = get_file_hash(fn)
+        cache_fn = os.path.join(cache_dir, f"{checksum}_p{page}.parquet")
+        if os.path.exists(cache_fn):
+            logger.info(f"Read table on page {page} from cache {cache_fn}")
+            return pd.read_parquet(cache_fn)
+
+    import tabula
+
+    table = tabula.read_pdf(fn, pages=page)[0]
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        table.to_parquet(cache_fn)
+
+    return table
+
+
+def distribute_cars(table):
+    """
+    Distribute the number of vehicles of a column evenly over itself and the
+    directly preceding columns without data, for all countries but the EU
+    total.
+    """
+    values = table.values
+    notna = ~np.isnan(values)
+    # cells up to and including the next column with data share a group
+    group = np.cumsum(notna[:, ::-1], axis=1)[:, ::-1]
+    size = (group[:, :, None] == group[:, None, :]).sum(axis=2)
+    distributed = table.bfill(axis=1) / size
+
+    eu = table.index == "EU"
+    distributed.loc[eu] = table.loc[eu]
+    return distributed
+
+
+def distribute_older_ages(df, number_of_years=8):
+    """
+    Distribute the share of vehicles older than 10 years over the years
+    before 2013 based on the average share of the other years.
+    """
+    share_last_year = df[">10 years"].fillna(0)
+    df = df.drop(columns=">10 years")
+    mean = df.fillna(0).mean(axis=1)
+    # convert columns to int
+    df.columns = df.columns.astype(int)
+    years_i = np.arange(2012, 2012 - number_of_years, -1)
+
+    i = np.arange(number_of_years)
+    av = (share_last_year / mean).values[:, None]
+    m = mean.values[:, None]
+    distributed = np.where(
+        i + 1 < av, m, np.where(i == av.astype(int), (av - i) * m, 0.0)
+    )
+
+    rest = share_last_year.values - distributed[:, :-1].sum(axis=1)
+    distributed[:, -1] = np.where(rest > mean.values, rest, distributed[:, -1])
+
+    distributed = pd.DataFrame(distributed, index=df.index, columns=years_i)
+    return pd.concat([df, distributed], axis=1)
+
+
+def read_ages_from_pdf(fn, page, name="CARS BY AGE", cache_dir=None):
+    table = read_pdf_table(fn, page, cache_dir)
     table.set_index(name, inplace=True)
 
     table.columns = table.iloc[1,:]
@@ -66,7 +102,7 @@ def read_ages_from_pdf(fn, page, name="CARS BY AGE"):
     table.index = cc.convert(table.index, to="iso2")
     table.drop('not found', inplace=True)
     
-    table = table.apply(lambda x: distirbute_cars(x), axis=1)
+    table = distribute_cars(table)
     
     # get shares instead of total numbers
     table.iloc[:, :-2] = table.iloc[:, :-2].div(table["Total"], axis=0)
@@ -74,7 +110,7 @@ def read_ages_from_pdf(fn, page, name="CARS BY AGE"):
     df = table.iloc[:,:-2]
     # swedish data is missing, filling with average data
     df = df.fillna(df.mean())
-    final_table = df.apply(distribute_older_ages, axis=1)
+    final_table = distribute_older_ages(df)
     
     return pd.concat([final_table, table.iloc[:, -2:]], axis=1)
 
@@ -91,10 +127,13 @@ if __name__ == "__main__":
     set_scenario_config(snakemake)
     fn = snakemake.input.ACEA_report
     # car ages
-    car_ages = read_ages_from_pdf(fn, page=11, name="CARS BY AGE")
+    cache_dir = snakemake.params.get("cache_dir")
+    car_ages = read_ages_from_pdf(fn, page=11, name="CARS BY AGE", cache_dir=cache_dir)
     
     # trucks ages
-    truck_ages = read_ages_from_pdf(fn, page=13, name="TRUCKS BY AGE")
+    truck_ages = read_ages_from_pdf(
+        fn, page=13, name="TRUCKS BY AGE", cache_dir=cache_dir
+    )
     
     
     car_ages.to_csv(snakemake.output.car_ages)
@@ -26,9 +26,8 @@ Relevant settings
 
     renewable:
         {technology}:
-            cutout: corine: luisa: grid_codes: distance: natura: max_depth:
-            max_shore_distance: min_shore_distance: capacity_per_sqkm:
-            correction_factor: min_p_max_pu: clip_p_max_pu: resource:
+            cutout: capacity_per_sqkm: correction_factor: min_p_max_pu:
+            clip_p_max_pu: resource:
 
 .. seealso::
     Documentation of the configuration file ``config/config.yaml`` at
@@ -37,34 +36,8 @@ Relevant settings
 Inputs
 ------
 
-- ``data/bundle/corine/g250_clc06_V18_5.tif``: `CORINE Land Cover (CLC)
-  <https://land.copernicus.eu/pan-european/corine-land-cover>`_ inventory on `44
-  classes <https://wiki.openstreetmap.org/wiki/Corine_Land_Cover#Tagging>`_ of
-  land use (e.g. forests, arable land, industrial, urban areas) at 100m
-  resolution.
-
-    .. image:: img/corine.png
-        :scale: 33 %
-
-- ``data/LUISA_basemap_020321_50m.tif``: `LUISA Base Map
-  <https://publications.jrc.ec.europa.eu/repository/handle/JRC124621>`_ land
-  coverage dataset at 50m resolution similar to CORINE. For codes in relation to
-  CORINE land cover, see `Annex 1 of the technical documentation
-  <https://publications.jrc.ec.europa.eu/repository/bitstream/JRC124621/technical_report_luisa_basemap_2018_v7_final.pdf>`_.
-
-- ``data/bundle/GEBCO_2014_2D.nc``: A `bathymetric
-  <https://en.wikipedia.org/wiki/Bathymetry>`_ data set with a global terrain
-  model for ocean and land at 15 arc-second intervals by the `General
-  Bathymetric Chart of the Oceans (GEBCO)
-  <https://www.gebco.net/data_and_products/gridded_bathymetry_data/>`_.
-
-    .. image:: img/gebco_2019_grid_image.jpg
-        :scale: 50 %
-
-    **Source:** `GEBCO
-    <https://www.gebco.net/data_and_products/images/gebco_2019_grid_image.jpg>`_
-
-- ``resources/natura.tiff``: confer :ref:`natura`
+- ``resources/availability_matrix_{technology}.nc``: confer
+  :mod:`determine_availability_matrix`
 - ``resources/offshore_shapes.geojson``: confer :ref:`shapes`
 - ``resources/regions_onshore.geojson``: (if not offshore wind), confer
   :ref:`busregions`
@@ -139,15 +112,9 @@ across the grid cells within each Voronoi cell. This is done by taking account
 of a combination of the available land at each grid cell and the capacity factor
 there.
 
-First the script computes how much of the technology can be installed at each
-cutout grid cell and each node using the `atlite
-<https://github.com/pypsa/atlite>`_ library. This uses the CORINE land use data,
-LUISA land use data, Natura2000 nature reserves, GEBCO bathymetry data, and
-shipping lanes.
-
-.. image:: img/eligibility.png
-    :scale: 50 %
-    :align: center
+How much of the technology can be installed at each cutout grid cell and each
+node is read from the availability matrix computed by
+:mod:`determine_availability_matrix`.
 
 To compute the layout of generators in each node's Voronoi cell, the installable
 potential in each grid cell is multiplied with the capacity factor at each grid
@@ -179,18 +146,18 @@ comes close to this limit, then the time series may slightly overestimate
 production since it is assumed the geographical distribution is proportional to
 capacity factor.
 """
-import functools
 import logging
 import time
 
 import atlite
 import geopandas as gpd
 import numpy as np
+import shapely
 import xarray as xr
 from _helpers import configure_logging, get_snapshots, set_scenario_config
 from dask.distributed import Client
-from pypsa.geo import haversine
-from shapely.geometry import LineString
+from pypsa.geo import haversine_pts
+from scipy.sparse import csr_matrix
 
 logger = logging.getLogger(__name__)
 
@@ -204,8 +171,6 @@ if __name__ == "__main__":
     set_scenario_config(snakemake)
 
     nprocesses = int(snakemake.threads)
-    noprogress = snakemake.config["run"].get("disable_progressbar", True)
-    noprogress = noprogress or not snakemake.config["atlite"]["show_progress"]
     params = snakemake.params.renewable[snakemake.wildcards.technology]
     resource = params["resource"]  # pv panel params / wind turbine params
 
@@ -238,78 +203,7 @@ if __name__ == "__main__":
     regions = regions.set_index("name").rename_axis("bus")
     buses = regions.index
 
-    res = params.get("excluder_resolution", 100)
-    excluder = atlite.ExclusionContainer(crs=3035, res=res)
-
-    if params["natura"]:
-        excluder.add_raster(snakemake.input.natura, nodata=0, allow_no_overlap=True)
-
-    for dataset in ["corine", "luisa"]:
-        kwargs = {"nodata": 0} if dataset == "luisa" else {}
-        settings = params.get(dataset, {})
-        if not settings:
-            continue
-        if dataset == "luisa" and res > 50:
-            logger.info(
-                "LUISA data is available at 50m resolution, "
-                f"but coarser {res}m resolution is used."
-            )
-        if isinstance(settings, list):
-            settings = {"grid_codes": settings}
-        if "grid_codes" in settings:
-            codes = settings["grid_codes"]
-            excluder.add_raster(
-                snakemake.input[dataset], codes=codes, invert=True, crs=3035, **kwargs
-            )
-        if settings.get("distance", 0.0) > 0.0:
-            codes = settings["distance_grid_codes"]
-            buffer = settings["distance"]
-            excluder.add_raster(
-                snakemake.input[dataset], codes=codes, buffer=buffer, crs=3035, **kwargs
-            )
-
-    if params.get("ship_threshold"):
-        shipping_threshold = (
-            params["ship_threshold"] * 8760 * 6
-        )  # approximation because 6 years of data which is hourly collected
-        func = functools.partial(np.less, shipping_threshold)
-        excluder.add_raster(
-            snakemake.input.ship_density, codes=func, crs=4326, allow_no_overlap=True
-        )
-
-    if params.get("max_depth"):
-        # lambda not supported for atlite + multiprocessing
-        # use named function np.greater with partially frozen argument instead
-        # and exclude areas where: -max_depth > grid cell depth
-        func = functools.partial(np.greater, -params["max_depth"])
-        excluder.add_raster(snakemake.input.gebco, codes=func, crs=4326, nodata=-1000)
-
-    if "min_shore_distance" in params:
-        buffer = params["min_shore_distance"]
-        excluder.add_geometry(snakemake.input.country_shapes, buffer=buffer)
-
-    if "max_shore_distance" in params:
-        buffer = params["max_shore_distance"]
-        excluder.add_geometry(
-            snakemake.input.country_shapes, buffer=buffer, invert=True
-        )
-
-    logger.info("Calculate landuse availability...")
-    start = time.time()
-
-    kwargs = dict(nprocesses=nprocesses, disable_progressbar=noprogress)
-    availability = cutout.availabilitymatrix(regions, excluder, **kwargs)
-
-    duration = time.time() - start
-    logger.info(f"Completed landuse availability calculation ({duration:2.2f}s)")
-
-    # For Moldova and Ukraine: Overwrite parts not covered by Corine with
-    # externally determined available areas
-    if "availability_matrix_MD_UA" in snakemake.input.keys():
-        availability_MDUA = xr.open_dataarray(
-            snakemake.input["availability_matrix_MD_UA"]
-        )
-        availability.loc[availability_MDUA.coords] = availability_MDUA
+    availability = xr.open_dataarray(snakemake.input.availability_matrix)
 
     area = cutout.grid.to_crs(3035).area / 1e6
     area = xr.DataArray(
@@ -371,21 +265,23 @@ if __name__ == "__main__":
     logger.info("Calculate average distances.")
     layoutmatrix = (layout * availability).stack(spatial=["y", "x"])
 
-    coords = cutout.grid[["x", "y"]]
-    bus_coords = regions[["x", "y"]]
-
-    average_distance = []
-    centre_of_mass = []
-    for bus in buses:
-        row = layoutmatrix.sel(bus=bus).data
-        nz_b = row != 0
-        row = row[nz_b]
-        co = coords[nz_b]
-        distances = haversine(bus_coords.loc[bus], co)
-        average_distance.append((distances * (row / row.sum())).sum())
-        centre_of_mass.append(co.values.T @ (row / row.sum()))
-
-    average_distance = xr.DataArray(average_distance, [buses])
+    coords = cutout.grid[["x", "y"]].values
+    bus_coords = regions[["x", "y"]].values
+
+    # weighted distances and centres of mass of all buses at once, only
+    # considering grid cells with non-zero layout
+    weights = csr_matrix(layoutmatrix.values)
+    rows, cols = weights.nonzero()
+    distances = csr_matrix(
+        (haversine_pts(bus_coords[rows], coords[cols]), (rows, cols)),
+        shape=weights.shape,
+    )
+    total = np.asarray(weights.sum(axis=1)).ravel()
+    norm = np.divide(1.0, total, out=np.zeros_like(total), where=total != 0)
+
+    average_distance = np.asarray(weights.multiply(distances).sum(axis=1)).ravel()
+    average_distance = xr.DataArray(average_distance * norm, [buses])
+    centre_of_mass = (weights @ coords) * norm[:, None]
     centre_of_mass = xr.DataArray(centre_of_mass, [buses, ("spatial", ["x", "y"])])
 
     ds = xr.merge(
@@ -401,12 +297,11 @@ if __name__ == "__main__":
     if snakemake.wildcards.technology.startswith("offwind"):
         logger.info("Calculate underwater fraction of connections.")
         offshore_shape = gpd.read_file(snakemake.input["offshore_shapes"]).unary_union
-        underwater_fraction = []
-        for bus in buses:
-            p = centre_of_mass.sel(bus=bus).data
-            line = LineString([p, regions.loc[bus, ["x", "y"]]])
-            frac = line.intersection(offshore_shape).length / line.length
-            underwater_fraction.append(frac)
+        lines = shapely.linestrings(
+            np.stack([centre_of_mass.values, bus_coords], axis=1)
+        )
+        underwater = shapely.intersection(lines, offshore_shape)
+        underwater_fraction = shapely.length(underwater) / shapely.length(lines)
 
         ds["underwater_fraction"] = xr.DataArray(underwater_fraction, [buses])
 
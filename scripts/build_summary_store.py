@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: : 2024 The PyPSA-Eur Authors
+#
+# SPDX-License-Identifier: MIT
+"""
+Convert the summary CSV files of one scenario run into a columnar store.
+
+The wide CSV files written by ``make_summary`` carry four header rows
+(cluster, ll, opt, planning_horizon) and up to four index columns. They are
+converted once into a long table which is written as a parquet dataset
+partitioned by metric and planning horizon. The name of the scenario run is
+stored as a column, so that the stores of several runs can be read as one
+dataset with :func:`read_summary_store`, loading only the metrics, planning
+horizons and columns needed.
+
+Outputs
+-------
+
+- ``results/<run>/summary_store/metric=<metric>/planning_horizon=<year>/*.parquet``
+"""
+
+import logging
+
+import pandas as pd
+from _helpers import configure_logging, set_scenario_config
+
+logger = logging.getLogger(__name__)
+
+# number of index columns of the summary CSV files of make_summary
+SUMMARY_INDEX_LEVELS = {
+    "nodal_costs": 4,
+    "nodal_capacities": 3,
+    "nodal_cfs": 3,
+    "cfs": 2,
+    "costs": 3,
+    "capacities": 2,
+    "curtailment": 1,
+    "energy": 2,
+    "supply": 3,
+    "supply_energy": 3,
+    "prices": 1,
+    "weighted_prices": 1,
+    "price_statistics": 1,
+    "market_values": 1,
+    "metrics": 1,
+}
+
+INDEX_COLUMNS = [f"level_{i}" for i in range(max(SUMMARY_INDEX_LEVELS.values()))]
+LABEL_COLUMNS = ["cluster", "ll", "opt", "planning_horizon"]
+
+
+def summary_to_long(fn, metric, scenario):
+    """
+    Read a summary CSV file into a long table with one row per value.
+
+    Missing index levels are filled with empty strings so that all
+    metrics share the same schema.
+    """
+    nlevels = SUMMARY_INDEX_LEVELS[metric]
+    df = pd.read_csv(fn, index_col=list(range(nlevels)), header=[0, 1, 2, 3])
+
+    df.index = pd.MultiIndex.from_frame(
+        df.index.to_frame(index=False).astype(str),
+        names=INDEX_COLUMNS[:nlevels],
+    )
+    df.columns.names = LABEL_COLUMNS
+
+    long = df.stack(LABEL_COLUMNS, future_stack=True).dropna()
+    long = long.rename("value").reset_index()
+
+    for col in INDEX_COLUMNS[nlevels:]:
+        long[col] = ""
+    long["planning_horizon"] = long["planning_horizon"].astype(int)
+    long["metric"] = metric
+    long["scenario"] = scenario
+
+    return long[["scenario", "metric"] + LABEL_COLUMNS + INDEX_COLUMNS + ["value"]]
+
+
+def read_summary_store(paths, metric, columns=None, planning_horizons=None):
+    """
+    Read one metric from the summary stores of one or several scenario runs.
+
+    Parameters
+    ----------
+    paths : str or list of str
+        Directories of the summary stores.
+    metric : str
+        Name of the summary, e.g. "costs" or "supply_energy".
+    columns : list of str, optional
+        Columns to load. Defaults to all columns.
+    planning_horizons : list of int, optional
+        Planning horizons to load. Defaults to all planning horizons.
+
+    Returns
+    -------
+    pd.DataFrame
+        Long table with one row per value.
+    """
+    import pyarrow.dataset as ds
+
+    if isinstance(paths, str):
+        paths = [paths]
+
+    dataset = ds.dataset(
+        [ds.dataset(p, format="parquet", partitioning="hive") for p in paths]
+    )
+
+    expr = ds.field("metric") == metric
+    if planning_horizons is not None:
+        expr &= ds.field("planning_horizon").isin(list(planning_horizons))
+
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+if __name__ == "__main__":
+    if "snakemake" not in globals():
+        from _helpers import mock_snakemake
+
+        snakemake = mock_snakemake("build_summary_store")
+
+    configure_logging(snakemake)
+    set_scenario_config(snakemake)
+
+    scenario = snakemake.wildcards.get("run", snakemake.config["run"]["name"])
+
+    long = pd.concat(
+        [
+            summary_to_long(snakemake.input[metric], metric, scenario)
+            for metric in SUMMARY_INDEX_LEVELS
+        ],
+        ignore_index=True,
+    )
+
+    logger.info(f"Write {len(long)} summary values of scenario '{scenario}'.")
+
+    long.to_parquet(
+        snakemake.output[0],
+        partition_cols=["metric", "planning_horizon"],
+        index=False,
+    )
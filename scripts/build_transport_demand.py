@@ -219,6 +219,33 @@ def build_registrations(nodal_transport_data):
                                     .div(nodal_transport_data[numb_car_cols[transport_type]].sum(axis=1)))
     
     pd.concat(share_reg).to_csv(snakemake.output.car_registration)
+
+
+def export_profile(df, fn, export_csv=False):
+    """
+    Write a profile with snapshots as index and nodes (and segments) as
+    columns to netCDF.
+
+    The values are stored as compressed float32 in one chunk per node, so
+    that readers only decompress the nodes they select. With
+    ``export_csv`` a CSV copy is written next to the file for inspection.
+    """
+    df = df.rename_axis(index="snapshots")
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.rename_axis(columns=["segment", "node"])
+        da = df.stack(["segment", "node"], future_stack=True).to_xarray()
+    else:
+        da = xr.DataArray(df.rename_axis(columns="node"))
+    da = da.rename("profile")
+
+    chunksizes = tuple(1 if dim == "node" else size for dim, size in da.sizes.items())
+    encoding = dict(dtype="float32", zlib=True, complevel=4, chunksizes=chunksizes)
+    da.to_netcdf(fn, encoding={da.name: encoding})
+
+    if export_csv:
+        df.to_csv(fn.replace(".nc", ".csv"))
+
+
 # %%
 if __name__ == "__main__":
     if "snakemake" not in globals():
@@ -268,7 +295,8 @@ if __name__ == "__main__":
     dsm_profile = bev_dsm_profile(snapshots, nodes, options)
 
     nodal_transport_data.to_csv(snakemake.output.transport_data)
-    transport_demand.to_csv(snakemake.output.transport_demand)
-    avail_profile.to_csv(snakemake.output.avail_profile)
-    dsm_profile.to_csv(snakemake.output.dsm_profile)
+    export_csv = snakemake.params.export_csv
+    export_profile(transport_demand, snakemake.output.transport_demand, export_csv)
+    export_profile(avail_profile, snakemake.output.avail_profile, export_csv)
+    export_profile(dsm_profile, snakemake.output.dsm_profile, export_csv)
     build_registrations(nodal_transport_data)
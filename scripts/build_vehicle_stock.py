@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: : 2024 The PyPSA-Eur Authors
+#
+# SPDX-License-Identifier: MIT
+"""
+Build the surviving share of the existing road vehicle fleet per clustered
+model region, vehicle type, engine, vintage and planning horizon.
+
+The fleet of the reference year is split into vintages by the age
+distributions of cars (light) and trucks (heavy) of the ACEA report. Each
+year, the share of new registrations in the fleet (scaled by
+``sector: car_reg_factor``) is scrapped, starting with the oldest vintage.
+The existing fleet is assumed to consist of internal combustion vehicles
+only.
+
+Outputs
+-------
+
+- ``resources/vehicle_stock_s{simpl}_{clusters}.nc``: share of the fleet of
+  the reference year with dimensions ``node``, ``transport_type``,
+  ``engine``, ``vintage`` and ``horizon``.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from _helpers import configure_logging, set_scenario_config
+
+logger = logging.getLogger(__name__)
+
+
+def read_vintage_shares(fn, pop_layout):
+    """
+    Read the shares of vintages in the fleet per country and map them to the
+    clustered model regions, oldest vintage first.
+    """
+    ages = pd.read_csv(fn, index_col=0).iloc[:, :-2]
+    ages.columns = ages.columns.astype(int)
+    ages = ages.sort_index(axis=1)
+
+    shares = ages.reindex(pop_layout.ct).fillna(ages.mean())
+    shares = shares.set_index(pop_layout.index)
+
+    return shares.div(shares.sum(axis=1), axis=0)
+
+
+def build_vehicle_stock(
+    vintage_shares, registrations, horizons, reg_factor=1.0, reference_year=2024
+):
+    """
+    Build the surviving share of each vintage in each planning horizon.
+
+    Parameters
+    ----------
+    vintage_shares : pd.DataFrame
+        Shares of vintages (columns, oldest first) in the fleet of the
+        reference year per node (index).
+    registrations : pd.Series
+        Share of new registrations in the fleet per year and node.
+    horizons : list of int
+        Planning horizons.
+    reg_factor : float
+        Factor on the rate of new registrations.
+    reference_year : int
+        Year of the fleet.
+
+    Returns
+    -------
+    xr.DataArray
+        Surviving share with dimensions ``node``, ``vintage`` and ``horizon``.
+    """
+    horizons = np.sort(np.asarray(horizons))
+    rate = registrations.reindex(vintage_shares.index).fillna(0) * reg_factor
+
+    # scrapped share of the fleet per node and horizon
+    scrapped = np.clip(np.outer(rate.values, horizons - reference_year), 0.0, 1.0)
+
+    # the oldest vintages are scrapped first
+    upper = vintage_shares.cumsum(axis=1).values
+    surviving = np.clip(
+        upper[:, :, None] - scrapped[:, None, :],
+        0.0,
+        vintage_shares.values[:, :, None],
+    )
+
+    return xr.DataArray(
+        surviving,
+        coords={
+            "node": vintage_shares.index,
+            "vintage": vintage_shares.columns,
+            "horizon": horizons,
+        },
+        dims=["node", "vintage", "horizon"],
+    )
+
+
+if __name__ == "__main__":
+    if "snakemake" not in globals():
+        from _helpers import mock_snakemake
+
+        snakemake = mock_snakemake(
+            "build_vehicle_stock",
+            simpl="",
+            clusters=38,
+        )
+    configure_logging(snakemake)
+    set_scenario_config(snakemake)
+
+    pop_layout = pd.read_csv(snakemake.input.clustered_pop_layout, index_col=0)
+    registrations = pd.read_csv(
+        snakemake.input.car_registration, index_col=[0, 1]
+    ).iloc[:, 0]
+
+    ages = {"light": snakemake.input.car_ages, "heavy": snakemake.input.truck_ages}
+
+    stock = []
+    for transport_type, fn in ages.items():
+        vintage_shares = read_vintage_shares(fn, pop_layout)
+        stock.append(
+            build_vehicle_stock(
+                vintage_shares,
+                registrations.loc[transport_type],
+                snakemake.params.planning_horizons,
+                reg_factor=snakemake.params.car_reg_factor,
+            )
+        )
+
+    # vintages of cars and trucks may differ
+    stock = xr.concat(
+        stock,
+        dim=pd.Index(list(ages), name="transport_type"),
+        join="outer",
+        fill_value=0.0,
+    )
+    stock = stock.expand_dims(engine=["ice"]).transpose(
+        "node", "transport_type", "engine", "vintage", "horizon"
+    )
+
+    stock.name = "surviving"
+    stock.to_netcdf(snakemake.output[0])
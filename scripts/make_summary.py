@@ -7,13 +7,24 @@ Create summary CSV files for all scenario runs including costs, capacities,
 capacity factors, curtailment, energy balances, prices and other metrics.
 """
 
+import hashlib
+import json
 import logging
+import multiprocessing as mp
+import os
 import sys
+from functools import partial
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
-import pypsa
-from _helpers import configure_logging, get_snapshots, set_scenario_config
+from _helpers import (
+    configure_logging,
+    get_file_hash,
+    get_snapshots,
+    load_network,
+    set_scenario_config,
+)
 from prepare_sector_network import prepare_costs
 
 idx = pd.IndexSlice
@@ -22,6 +33,26 @@ logger = logging.getLogger(__name__)
 
 opt_name = {"Store": "e", "Line": "s", "Transformer": "s"}
 
+outputs = [
+    "nodal_costs",
+    "nodal_capacities",
+    "nodal_cfs",
+    "cfs",
+    "costs",
+    "capacities",
+    "curtailment",
+    "energy",
+    "supply",
+    "supply_energy",
+    "prices",
+    "weighted_prices",
+    "price_statistics",
+    "market_values",
+    "metrics",
+]
+
+column_names = ["cluster", "ll", "opt", "planning_horizon"]
+
 
 def assign_carriers(n):
     if "carrier" not in n.lines:
@@ -627,47 +658,81 @@ def calculate_price_statistics(n, label, price_statistics):
     return price_statistics
 
 
-def make_summaries(networks_dict):
-    outputs = [
-        "nodal_costs",
-        "nodal_capacities",
-        "nodal_cfs",
-        "cfs",
-        "costs",
-        "capacities",
-        "curtailment",
-        "energy",
-        "supply",
-        "supply_energy",
-        "prices",
-        "weighted_prices",
-        "price_statistics",
-        "market_values",
-        "metrics",
-    ]
+def get_summary_key(params):
+    """
+    Hash this script and the rule parameters, which invalidate all cached
+    summaries when changed.
+    """
+    digest = hashlib.sha256(get_file_hash(__file__).encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
 
-    columns = pd.MultiIndex.from_tuples(
-        networks_dict.keys(),
-        names=["cluster", "ll", "opt", "planning_horizon"],
-    )
 
-    df = {output: pd.DataFrame(columns=columns, dtype=float) for output in outputs}
-    for label, filename in networks_dict.items():
-        logger.info(f"Make summary for scenario {label}, using {filename}")
+def make_summary(item, cache_dir=None, summary_key=""):
+    """
+    Calculate all summary outputs for a single network.
+
+    If ``cache_dir`` is given, the outputs are cached there keyed by the
+    hash of the network file and ``summary_key`` and reused as long as both
+    are unchanged. Returns None if the network is not (yet) solved.
+    """
+    label, filename = item
 
-        try:
-            n = pypsa.Network(filename)
-        except FileNotFoundError:
-            logger.info(f"{label} not yet solved.")
-            continue
+    if not os.path.exists(filename):
+        logger.info(f"{label} not yet solved.")
+        return None
 
-        if not hasattr(n, "objective"): continue
+    fn = None
+    if cache_dir is not None:
+        digest = hashlib.sha256(get_file_hash(filename).encode())
+        digest.update(summary_key.encode())
+        key = digest.hexdigest() + "_" + "_".join(map(str, label))
+        fn = Path(cache_dir) / f"{key}.pkl"
+        if fn.exists():
+            logger.info(f"Reuse cached summary for scenario {label} from {fn}")
+            return pd.read_pickle(fn)
 
-        assign_carriers(n)
-        assign_locations(n)
+    logger.info(f"Make summary for scenario {label}, using {filename}")
 
-        for output in outputs:
-            df[output] = globals()["calculate_" + output](n, label, df[output])
+    n = load_network(filename)
+
+    if not hasattr(n, "objective"):
+        return None
+
+    assign_carriers(n)
+    assign_locations(n)
+
+    columns = pd.MultiIndex.from_tuples([label], names=column_names)
+    df = {}
+    for output in outputs:
+        df[output] = globals()["calculate_" + output](
+            n, label, pd.DataFrame(columns=columns, dtype=float)
+        )
+
+    if fn is not None:
+        pd.to_pickle(df, fn)
+
+    return df
+
+
+def make_summaries(networks_dict, nprocesses=1, cache_dir=None, summary_key=""):
+    columns = pd.MultiIndex.from_tuples(networks_dict.keys(), names=column_names)
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    func = partial(make_summary, cache_dir=cache_dir, summary_key=summary_key)
+    with mp.Pool(processes=nprocesses) as pool:
+        summaries = pool.map(func, networks_dict.items(), chunksize=1)
+    summaries = [s for s in summaries if s is not None]
+
+    df = {}
+    for output in outputs:
+        if summaries:
+            df[output] = pd.concat([s[output] for s in summaries], axis=1)
+            df[output] = df[output].reindex(columns=columns)
+        else:
+            df[output] = pd.DataFrame(columns=columns, dtype=float)
 
     return df
 
@@ -710,7 +775,12 @@ if __name__ == "__main__":
         Nyears,
     )
 
-    df = make_summaries(networks_dict)
+    df = make_summaries(
+        networks_dict,
+        nprocesses=snakemake.threads,
+        cache_dir=snakemake.params.get("summary_cache"),
+        summary_key=get_summary_key(dict(snakemake.params.items())),
+    )
 
     df["metrics"].loc["total costs"] = df["costs"].sum()
 
@@ -11,8 +11,7 @@ other metrics.
 
 import numpy as np
 import pandas as pd
-import pypsa
-from _helpers import set_scenario_config
+from _helpers import load_network, set_scenario_config
 from make_summary import calculate_cfs  # noqa: F401
 from make_summary import calculate_nodal_cfs  # noqa: F401
 from make_summary import calculate_nodal_costs  # noqa: F401
@@ -693,7 +692,7 @@ def make_summaries(networks_dict):
     for label, filename in iteritems(networks_dict):
         print(label, filename)
         try:
-            n = pypsa.Network(filename)
+            n = load_network(filename)
         except OSError:
             print(label, " not solved yet.")
             continue
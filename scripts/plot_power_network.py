@@ -13,8 +13,7 @@ import cartopy.crs as ccrs
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import pandas as pd
-import pypsa
-from _helpers import configure_logging, set_scenario_config
+from _helpers import configure_logging, load_network, set_scenario_config
 from plot_summary import preferred_order, rename_techs
 from pypsa.plot import add_legend_circles, add_legend_lines, add_legend_patches
 
@@ -289,7 +288,7 @@ if __name__ == "__main__":
     configure_logging(snakemake)
     set_scenario_config(snakemake)
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
     
    
     regions = gpd.read_file(snakemake.input.regions).set_index("name")
@@ -12,8 +12,7 @@ import logging
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import pandas as pd
-import pypsa
-from _helpers import configure_logging, set_scenario_config
+from _helpers import configure_logging, load_network, set_scenario_config
 from plot_power_network import assign_location, load_projection, rename_techs_tyndp
 from plot_summary import preferred_order
 from pypsa.plot import add_legend_circles, add_legend_lines
@@ -186,7 +185,7 @@ if __name__ == "__main__":
     configure_logging(snakemake)
     set_scenario_config(snakemake)
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
 
     regions = gpd.read_file(snakemake.input.regions).set_index("name")
 
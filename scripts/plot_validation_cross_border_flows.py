@@ -7,9 +7,8 @@
 import country_converter as coco
 import matplotlib.pyplot as plt
 import pandas as pd
-import pypsa
 import seaborn as sns
-from _helpers import configure_logging, set_scenario_config
+from _helpers import configure_logging, load_network, set_scenario_config
 
 sns.set_theme("paper", style="whitegrid")
 
@@ -191,7 +190,7 @@ if __name__ == "__main__":
 
     countries = snakemake.params.countries
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
     n.loads.carrier = "load"
 
     historic = pd.read_csv(
@@ -6,9 +6,8 @@
 
 import matplotlib.pyplot as plt
 import pandas as pd
-import pypsa
 import seaborn as sns
-from _helpers import configure_logging, set_scenario_config
+from _helpers import configure_logging, load_network, set_scenario_config
 
 sns.set_theme("paper", style="whitegrid")
 
@@ -26,7 +25,7 @@ if __name__ == "__main__":
     configure_logging(snakemake)
     set_scenario_config(snakemake)
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
     n.loads.carrier = "load"
 
     historic = pd.read_csv(
@@ -64,6 +64,8 @@ import pandas as pd
 import pypsa
 from _helpers import (
     configure_logging,
+    get_time_series_matrix,
+    segment_time_series,
     set_scenario_config,
     update_config_from_wildcards,
 )
@@ -219,50 +221,24 @@ def average_every_nhours(n, offset):
     return m
 
 
-def apply_time_segmentation(n, segments, solver_name="cbc"):
+def apply_time_segmentation(n, segments, solver_name="cbc", cache_dir=None):
     logger.info(f"Aggregating time series to {segments} segments.")
-    try:
-        import tsam.timeseriesaggregation as tsam
-    except ImportError:
-        raise ModuleNotFoundError(
-            "Optional dependency 'tsam' not found." "Install via 'pip install tsam'"
-        )
-
-    p_max_pu_norm = n.generators_t.p_max_pu.max()
-    p_max_pu = n.generators_t.p_max_pu / p_max_pu_norm
-
-    load_norm = n.loads_t.p_set.max()
-    load = n.loads_t.p_set / load_norm
 
-    inflow_norm = n.storage_units_t.inflow.max()
-    inflow = n.storage_units_t.inflow / inflow_norm
-
-    raw = pd.concat([p_max_pu, load, inflow], axis=1, sort=False)
-
-    agg = tsam.TimeSeriesAggregation(
-        raw,
-        hoursPerPeriod=len(raw),
-        noTypicalPeriods=1,
-        noSegments=int(segments),
-        segmentation=True,
-        solver=solver_name,
+    raw = get_time_series_matrix(
+        n,
+        attrs={"Generator": ["p_max_pu"], "Load": ["p_set"], "StorageUnit": ["inflow"]},
     )
-
-    segmented = agg.createTypicalPeriods()
-
-    weightings = segmented.index.get_level_values("Segment Duration")
-    offsets = np.insert(np.cumsum(weightings[:-1]), 0, 0)
-    snapshots = [n.snapshots[0] + pd.Timedelta(f"{offset}h") for offset in offsets]
+    weightings, segmented = segment_time_series(
+        raw, segments, solver_name=solver_name, cache_dir=cache_dir
+    )
+    snapshots = weightings.index
 
     n.set_snapshots(pd.DatetimeIndex(snapshots, name="name"))
-    n.snapshot_weightings = pd.Series(
-        weightings, index=snapshots, name="weightings", dtype="float64"
-    )
+    n.snapshot_weightings = weightings
 
-    segmented.index = snapshots
-    n.generators_t.p_max_pu = segmented[n.generators_t.p_max_pu.columns] * p_max_pu_norm
-    n.loads_t.p_set = segmented[n.loads_t.p_set.columns] * load_norm
-    n.storage_units_t.inflow = segmented[n.storage_units_t.inflow.columns] * inflow_norm
+    segmented = segmented.astype(float)
+    for component, key in segmented.columns.droplevel(2).unique():
+        n.pnl(component)[key] = segmented[component, key]
 
     return n
 
@@ -338,7 +314,12 @@ if __name__ == "__main__":
     if is_string and time_resolution.lower().endswith("seg"):
         solver_name = snakemake.config["solving"]["solver"]["name"]
         segments = int(time_resolution.replace("seg", ""))
-        n = apply_time_segmentation(n, segments, solver_name)
+        n = apply_time_segmentation(
+            n,
+            segments,
+            solver_name,
+            cache_dir=snakemake.params.get("segmentation_cache"),
+        )
 
     if snakemake.params.co2limit_enable:
         add_co2limit(n, snakemake.params.co2limit, Nyears)
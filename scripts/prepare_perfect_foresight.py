@@ -14,6 +14,10 @@ import pandas as pd
 import pypsa
 from _helpers import (
     configure_logging,
+    export_network,
+    get_time_series_matrix,
+    load_network,
+    segment_time_series,
     set_scenario_config,
     update_config_from_wildcards,
 )
@@ -150,6 +154,11 @@ def concat_networks(years):
     """
     Concat given pypsa networks and adds build_year.
 
+    The single-year networks are read once. Static data is imported
+    directly, while only the time series of assets which are new in an
+    investment period are kept. Afterwards, the time-dependent data of the
+    whole planning horizon is allocated once and filled period by period.
+
     Return:
         n : pypsa.Network for the whole planning horizon
     """
@@ -161,10 +170,18 @@ def concat_networks(years):
     # final concatenated network
     n = pypsa.Network()
 
-    # iterate over single year networks and concat to perfect foresight network
+    snapshots = {}
+    weightings = {}
+    # time series as list of (investment period, pd.DataFrame); loads are
+    # only valid in their own investment period, while all other assets keep
+    # the time series of the investment period they first appear in
+    series = {}
+    seen = {}
+
+    # iterate over single year networks and collect data of each period
     for i, network_path in enumerate(network_paths):
         year = years[i]
-        network = pypsa.Network(network_path)
+        network = load_network(network_path)
         adjust_electricity_grid(network, year, years)
         if not i == 0:
             add_build_year_to_new_assets(network, year)
@@ -188,44 +205,63 @@ def concat_networks(years):
             import_components_from_dataframe(n, missing, component.name)
 
         # time variant --------------------------------------------------
-        network_sns = pd.MultiIndex.from_product([[year], network.snapshots])
-        snapshots = n.snapshots.drop("now", errors="ignore").union(network_sns)
-        n.set_snapshots(snapshots)
+        snapshots[year] = network.snapshots
+        weightings[year] = network.snapshot_weightings
 
         for component in network.iterate_components():
-            pnl = getattr(n, component.list_name + "_t")
             for k in iterkeys(component.pnl):
-                pnl_year = component.pnl[k].copy().reindex(snapshots, level=1)
-                if pnl_year.empty and (not (component.name == "Load" and k == "p_set")):
-                    continue
-                if component.name == "Load":
+                key = (component.list_name, k)
+                pnl_year = component.pnl[k]
+                if component.name == "Load" and k == "p_set":
                     static_load = network.loads.loc[network.loads.p_set != 0]
-                    static_load_t = expand_series(static_load.p_set, network_sns).T
-                    pnl_year = pd.concat(
-                        [pnl_year.reindex(network_sns), static_load_t], axis=1
-                    )
-                    columns = (pnl[k].columns.union(pnl_year.columns)).unique()
-                    pnl[k] = pnl[k].reindex(columns=columns)
-                    pnl[k].loc[pnl_year.index, pnl_year.columns] = pnl_year
-
-                else:
-                    # For components that aren't new, we just extend
-                    # time-varying data from the previous investment
-                    # period.
-                    if i > 0:
-                        pnl[k].loc[(year,)] = pnl[k].loc[(years[i - 1],)].values
-
-                    # Now, add time-varying data for new components.
-                    cols = pnl_year.columns.difference(pnl[k].columns)
-                    pnl[k] = pd.concat([pnl[k], pnl_year[cols]], axis=1)
-
-        n.snapshot_weightings.loc[year, :] = network.snapshot_weightings.values
+                    static_load_t = expand_series(
+                        static_load.p_set, network.snapshots
+                    ).T
+                    pnl_year = pd.concat([pnl_year, static_load_t], axis=1)
+                elif component.name != "Load":
+                    pnl_year = pnl_year.loc[
+                        :, pnl_year.columns.difference(seen.get(key, []))
+                    ]
+                if pnl_year.empty:
+                    continue
+                seen[key] = pnl_year.columns.union(seen.get(key, []))
+                series.setdefault(key, []).append((year, pnl_year))
 
         # (3) global constraints
         for component in network.iterate_components(["GlobalConstraint"]):
             add_year_to_constraints(network, year)
             import_components_from_dataframe(n, component.df, component.name)
 
+        del network
+
+    # allocate time-dependent data of the whole planning horizon once
+    lengths = [len(snapshots[year]) for year in years]
+    n.set_snapshots(
+        pd.MultiIndex.from_arrays(
+            [
+                np.repeat(years, lengths),
+                np.concatenate([snapshots[year] for year in years]),
+            ]
+        )
+    )
+    for year in years:
+        n.snapshot_weightings.loc[year, :] = weightings[year].values
+
+    starts = dict(zip(years, np.cumsum([0] + lengths[:-1])))
+    for (list_name, k), frames in series.items():
+        columns = seen[(list_name, k)]
+        values = np.full((len(n.snapshots), len(columns)), np.nan)
+        for year in years:
+            block = values[starts[year] : starts[year] + len(snapshots[year])]
+            for year_df, df in frames:
+                if list_name == "loads" and year_df != year:
+                    continue
+                col_i = columns.get_indexer(df.columns)
+                block[:, col_i] = df.reindex(snapshots[year]).values
+        getattr(n, list_name + "_t")[k] = pd.DataFrame(
+            values, index=n.snapshots, columns=columns
+        )
+
     # set investment periods
     n.investment_periods = n.snapshots.levels[0]
     # weighting of the investment period -> assuming last period same weighting as the period before
@@ -425,7 +461,7 @@ def add_H2_boilers(n):
 
 
 def apply_time_segmentation_perfect(
-    n, segments, solver_name="cbc", overwrite_time_dependent=True
+    n, segments, solver_name="cbc", overwrite_time_dependent=True, cache_dir=None
 ):
     """
     Aggregating time series to segments with different lengths.
@@ -437,50 +473,19 @@ def apply_time_segmentation_perfect(
         solver_name: (str) name of solver
         overwrite_time_dependent: (bool) overwrite time dependent data of pypsa network
         with typical time series created by tsam
+        cache_dir: (str) directory in which segmentations are cached
     """
-    try:
-        import tsam.timeseriesaggregation as tsam
-    except ImportError:
-        raise ModuleNotFoundError(
-            "Optional dependency 'tsam' not found." "Install via 'pip install tsam'"
-        )
-
     # get all time-dependent data
-    columns = pd.MultiIndex.from_tuples([], names=["component", "key", "asset"])
-    raw = pd.DataFrame(index=n.snapshots, columns=columns)
-    for c in n.iterate_components():
-        for attr, pnl in c.pnl.items():
-            # exclude e_min_pu which is used for SOC of EVs in the morning
-            if not pnl.empty and attr != "e_min_pu":
-                df = pnl.copy()
-                df.columns = pd.MultiIndex.from_product([[c.name], [attr], df.columns])
-                raw = pd.concat([raw, df], axis=1)
+    # exclude e_min_pu which is used for SOC of EVs in the morning
+    raw = get_time_series_matrix(n, exclude_attrs=["e_min_pu"])
     raw = raw.dropna(axis=1)
     sn_weightings = {}
 
     for year in raw.index.levels[0]:
         logger.info(f"Find representative snapshots for {year}.")
-        raw_t = raw.loc[year]
-        # normalise all time-dependent data
-        annual_max = raw_t.max().replace(0, 1)
-        raw_t = raw_t.div(annual_max, level=0)
         # get representative segments
-        agg = tsam.TimeSeriesAggregation(
-            raw_t,
-            hoursPerPeriod=len(raw_t),
-            noTypicalPeriods=1,
-            noSegments=int(segments),
-            segmentation=True,
-            solver=solver_name,
-        )
-        segmented = agg.createTypicalPeriods()
-
-        weightings = segmented.index.get_level_values("Segment Duration")
-        offsets = np.insert(np.cumsum(weightings[:-1]), 0, 0)
-        timesteps = [raw_t.index[0] + pd.Timedelta(f"{offset}h") for offset in offsets]
-        snapshots = pd.DatetimeIndex(timesteps)
-        sn_weightings[year] = pd.Series(
-            weightings, index=snapshots, name="weightings", dtype="float64"
+        sn_weightings[year], _ = segment_time_series(
+            raw.loc[year], segments, solver_name=solver_name, cache_dir=cache_dir
         )
 
     sn_weightings = pd.concat(sn_weightings)
@@ -521,7 +526,12 @@ if __name__ == "__main__":
     solver_name = snakemake.config["solving"]["solver"]["name"]
     segments = snakemake.params.time_resolution
     if isinstance(segments, (int, float)):
-        n = apply_time_segmentation_perfect(n, segments, solver_name=solver_name)
+        n = apply_time_segmentation_perfect(
+            n,
+            segments,
+            solver_name=solver_name,
+            cache_dir=snakemake.params.get("segmentation_cache"),
+        )
         adjust_transport_temporal_agg(n)
 
     # adjust global constraints lv limit if the same for all years
@@ -541,4 +551,4 @@ if __name__ == "__main__":
     n = set_carbon_constraints(n)
 
     # export network
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0])
@@ -9,6 +9,7 @@ technologies for the buildings, transport and industry sectors.
 
 import logging
 import os
+import sys
 from itertools import product
 from types import SimpleNamespace
 
@@ -17,8 +18,13 @@ import numpy as np
 import pandas as pd
 import pypsa
 import xarray as xr
+from _benchmark import stage_profiler
 from _helpers import (
     configure_logging,
+    export_network,
+    get_time_series_matrix,
+    load_network,
+    segment_time_series,
     set_scenario_config,
     update_config_from_wildcards,
 )
@@ -1537,466 +1543,358 @@ def check_land_transport_shares(shares):
         )
 
 
-def get_temp_efficency(
-    car_efficiency,
-    temperature,
-    deadband_lw,
-    deadband_up,
-    degree_factor_lw,
-    degree_factor_up,
-):
+# carrier label of the vehicle links per engine type
+LAND_TRANSPORT_ENGINES = {
+    "fuel_cell": "fuel cell",
+    "electric": "EV",
+    "ice": "oil",
+}
+
+
+def get_car_efficiencies(segments):
     """
-    Correct temperature depending on heating and cooling for respective car
-    type.
+    Get the efficiencies of the vehicles in 100 km per MWh input per engine
+    type and land transport segment, either from the config or from the mean
+    efficiency of the cost technologies of the segment.
     """
-    # temperature correction for EVs
-    dd = transport_degree_factor(
-        temperature,
-        deadband_lw,
-        deadband_up,
-        degree_factor_lw,
-        degree_factor_up,
+    car_efficiencies = pd.DataFrame(
+        index=list(LAND_TRANSPORT_ENGINES), columns=list(segments), dtype=float
     )
+    for segment, settings in segments.items():
+        for engine in LAND_TRANSPORT_ENGINES:
+            if settings["efficiency"] == "costs":
+                car_efficiency = costs.loc[
+                    settings["costs"][engine], "efficiency"
+                ].mean()
+                # convert kWh/km in MWh per 100 km
+                car_efficiency = (1 / (1e2 * car_efficiency)) * 1e3
+            else:
+                car_efficiency = options[f"transport_{engine}_efficiency"][segment]
+            car_efficiencies.loc[engine, segment] = car_efficiency
 
-    temp_eff = 1 / (1 + dd)
+    return car_efficiencies
 
-    return car_efficiency * temp_eff
 
+def get_land_transport_shares(segments, endogenous):
+    """
+    Get the exogenous shares of the engine types per land transport segment.
+    """
+    shares = pd.DataFrame(
+        {
+            segment: {
+                engine: get(
+                    options[f"land_transport_{engine}_share"][segment], investment_year
+                )
+                for engine in LAND_TRANSPORT_ENGINES
+            }
+            for segment in segments
+        },
+        dtype=float,
+    )
 
-def add_EVs(
-    n,
-    nodes,
-    avail_profile,
-    dsm_profile,
-    p_set,
-    electric_share,
-    number_cars,
-    temperature,
-    car_efficiency,
-    suffix,
-    transport_type="light"
-):
-    
-    if not "Li ion" in n.carriers.index:
-        n.add("Carrier", "Li ion")
+    if not endogenous:
+        for (engine, segment), share in shares.stack().items():
+            logger.info(f"{engine} {segment} share: {share*100}%")
+        check_land_transport_shares(shares)
+    else:
+        logger.info("Endogenous optimisation of land transport sector")
+        shares.loc[:, :] = 1 / 3
 
-    n.madd(
-        "Bus",
-        nodes,
-        suffix=f" EV battery {transport_type}",
-        location=nodes,
-        carrier="Li ion",
-        unit="MWh_el",
-    )
-        
-    # temperature corrected efficiency
-    efficiency = get_temp_efficency(
-        car_efficiency,
-        temperature,
-        options["transport_heating_deadband_lower"],
-        options["transport_heating_deadband_upper"],
-        options["EV_lower_degree_factor"],
-        options["EV_upper_degree_factor"],
-    )
+    return shares
 
-    p_shifted = (p_set + cycling_shift(p_set, 1) + cycling_shift(p_set, 2)) / 3
 
-    cyclic_eff = p_set.div(p_shifted)
+def add_land_transport(n, costs):
 
-    efficiency *= cyclic_eff
+    logger.info("Add land transport")
 
-    p_nom = electric_share * p_set.div(efficiency).max()
+    nodes = spatial.nodes
 
-    profile = p_set.div(efficiency) / p_set.div(efficiency).max()
+    # read in transport demand in units driven km [100 km], only for the
+    # nodes of the network
+    transport = xr.open_dataarray(snakemake.input.transport_demand).sel(node=nodes)
+    snapshots = transport.indexes["snapshots"]
+    number_cars = pd.read_csv(snakemake.input.transport_data, index_col=0)
+    avail_profile = (
+        xr.open_dataarray(snakemake.input.avail_profile).sel(node=nodes).to_pandas()
+    ).astype(float)
+    dsm_profile = (
+        xr.open_dataarray(snakemake.input.dsm_profile).sel(node=nodes).to_pandas()
+    ).astype(float)
+    # temperature for correction factor for heating/cooling
+    temperature = xr.open_dataarray(snakemake.input.temp_air_total).to_pandas()
 
-    n.madd(
-        "Link",
-        nodes,
-        suffix=suffix,
-        bus0=nodes + f" EV battery {transport_type}",
-        bus1=nodes + f" land transport {transport_type}",
-        carrier=suffix[1:],
-        efficiency=efficiency,
-        p_min_pu=profile,
-        p_max_pu=profile,
-        p_nom=p_nom,
-        p_nom_extendable=False,
-        lifetime=15,
-    )
-    
-    p_nom = (number_cars * options.get("bev_charge_rate", 0.011)
-             * electric_share)
+    segments = {
+        segment: settings
+        for segment, settings in options["land_transport_segments"].items()
+        if segment in transport.indexes["segment"]
+    }
+    missing = options["land_transport_segments"].keys() - segments.keys()
+    if missing:
+        logger.warning(f"No land transport demand for segments {missing}, skipping.")
 
-    n.madd(
-        "Link",
-        nodes,
-        suffix=f" BEV charger {transport_type}",
-        bus0=nodes,
-        bus1=nodes + f" EV battery {transport_type}",
-        p_nom=p_nom,
-        carrier=f"BEV charger {transport_type}",
-        p_max_pu=avail_profile[nodes],
-        lifetime=1,
-        efficiency=options.get("bev_charge_efficiency", 0.9),
+    endogenous = options["endogenous_transport"]
+    shares = get_land_transport_shares(segments, endogenous)
+    car_efficiencies = get_car_efficiencies(segments)
+
+    # demand and temperature corrected efficiencies of all engines and
+    # segments in one pass, dimensions (engine, segment, snapshot, node)
+    demand = (
+        transport.sel(segment=list(segments))
+        .transpose("segment", "snapshots", "node")
+        .values.astype(float)
     )
-
-    if options["v2g"] and transport_type=="light":
-        n.madd(
-            "Link",
-            nodes,
-            suffix=" V2G",
-            bus1=nodes,
-            bus0=nodes + f" EV battery {transport_type}",
-            p_nom=p_nom,
-            carrier="V2G",
-            p_max_pu=avail_profile[nodes],
-            lifetime=1,
-            efficiency=options.get("bev_charge_efficiency", 0.9),
+    shifted = (demand + np.roll(demand, 1, axis=1) + np.roll(demand, 2, axis=1)) / 3
+
+    efficiency = []
+    for engine in LAND_TRANSPORT_ENGINES:
+        kind = "EV" if engine == "electric" else "ICE"
+        dd = transport_degree_factor(
+            temperature,
+            options["transport_heating_deadband_lower"],
+            options["transport_heating_deadband_upper"],
+            options[f"{kind}_lower_degree_factor"],
+            options[f"{kind}_upper_degree_factor"],
+        ).reindex(index=snapshots, columns=nodes)
+        eff = car_efficiencies.loc[engine].values[:, None, None] * (1 / (1 + dd.values))
+        if engine == "electric":
+            # EVs can shift their charging within three hours
+            eff = eff * (demand / shifted)
+        efficiency.append(eff)
+    efficiency = np.stack(efficiency)
+
+    consumption = demand / efficiency
+    p_nom = shares.values[:, :, None] * consumption.max(axis=2)
+    profile = consumption / consumption.max(axis=2, keepdims=True)
+
+    def frame(values, index):
+        return pd.DataFrame(values, index=snapshots, columns=index)
+
+    buses = []
+    loads = []
+    links = []
+    links_t = {"efficiency": [], "p_min_pu": [], "p_max_pu": []}
+    stores = []
+    stores_t = []
+    for j, (segment, settings) in enumerate(segments.items()):
+
+        demand_carrier = f"land transport demand {segment}"
+        demand_buses = nodes + f" land transport {segment}"
+        battery_buses = nodes + f" EV battery {segment}"
+
+        buses.append(
+            pd.DataFrame(
+                dict(location=nodes, carrier=demand_carrier, unit="100 km"),
+                index=demand_buses,
+            )
         )
 
-    if options["bev_dsm"] and transport_type=="light":
-        e_nom = (
-            number_cars
-            * options.get("bev_energy", 0.05)
-            * options["bev_availability"]
-            * electric_share
-        )
+        factor = vary_demand_factor(options, demand_carrier)
+        if factor != 1.0:
+            logger.info(
+                f"Vary {demand_carrier} by factor {factor} in {investment_year}"
+            )
+        loads.append(frame(factor * demand[j], demand_buses))
 
-        n.madd(
-            "Store",
-            nodes,
-            suffix=" battery storage",
-            bus=nodes + f" EV battery {transport_type}",
-            carrier="battery storage",
-            e_cyclic=True,
-            e_nom=e_nom,
-            e_max_pu=1,
-            e_min_pu=dsm_profile[nodes],
-            lifetime=15,
-        )
+        for i, (engine, label) in enumerate(LAND_TRANSPORT_ENGINES.items()):
+            share = shares.loc[engine, segment]
+            if share <= 0:
+                continue
 
+            carrier = f"land transport {label} {segment}"
+            names = nodes + " " + carrier
+            if engine == "electric":
+                bus0, bus2, efficiency2, lifetime = battery_buses, "", 1.0, 15
+            elif engine == "fuel_cell":
+                bus0, bus2, efficiency2, lifetime = spatial.h2.nodes, "", 1.0, 1
+            else:
+                bus0, bus2, efficiency2, lifetime = (
+                    spatial.oil.nodes,
+                    "co2 atmosphere",
+                    costs.at["oil", "CO2 intensity"],
+                    1,
+                )
 
-def add_fuel_cell_cars(n, nodes, p_set, fuel_cell_share, temperature,
-                       car_efficiency, suffix,
-                       transport_type="light"
-                       ):
-
-   
-    # temperature corrected efficiency
-    efficiency = get_temp_efficency(
-        car_efficiency,
-        temperature,
-        options["transport_heating_deadband_lower"],
-        options["transport_heating_deadband_upper"],
-        options["ICE_lower_degree_factor"],
-        options["ICE_upper_degree_factor"],
-    )
+            links.append(
+                pd.DataFrame(
+                    dict(
+                        bus0=bus0,
+                        bus1=demand_buses,
+                        bus2=bus2,
+                        carrier=carrier,
+                        efficiency=1.0,
+                        efficiency2=efficiency2,
+                        p_nom=p_nom[i, j],
+                        lifetime=lifetime,
+                    ),
+                    index=names,
+                )
+            )
+            links_t["efficiency"].append(frame(efficiency[i, j], names))
+            links_t["p_min_pu"].append(frame(profile[i, j], names))
+            links_t["p_max_pu"].append(frame(profile[i, j], names))
 
-    p_nom = fuel_cell_share * p_set.div(efficiency).max()
+            if engine != "electric":
+                continue
 
-    profile = p_set.div(efficiency) / p_set.div(efficiency).max()
+            buses.append(
+                pd.DataFrame(
+                    dict(location=nodes, carrier="Li ion", unit="MWh_el"),
+                    index=battery_buses,
+                )
+            )
 
-    n.madd(
-        "Link",
-        nodes,
-        suffix=suffix,
-        bus0=spatial.h2.nodes,
-        bus1=nodes + f" land transport {transport_type}",
-        carrier=suffix[1:],
-        efficiency=efficiency,
-        p_nom_extendable=False,
-        p_nom=p_nom,
-        p_min_pu=profile,
-        p_max_pu=profile,
-        lifetime=1,
-    )
+            cars = number_cars.loc[nodes, settings["vehicles"]].sum(axis=1).values
+            charge_p_nom = cars * options.get("bev_charge_rate", 0.011) * share
 
+            chargers = {
+                f" BEV charger {segment}": (
+                    nodes,
+                    battery_buses,
+                    f"BEV charger {segment}",
+                ),
+            }
+            if options["v2g"] and settings.get("v2g", False):
+                chargers[f" V2G {segment}"] = (battery_buses, nodes, f"V2G {segment}")
+
+            for suffix, (
+                charger_bus0,
+                charger_bus1,
+                charger_carrier,
+            ) in chargers.items():
+                names = nodes + suffix
+                links.append(
+                    pd.DataFrame(
+                        dict(
+                            bus0=charger_bus0,
+                            bus1=charger_bus1,
+                            bus2="",
+                            carrier=charger_carrier,
+                            efficiency=options.get("bev_charge_efficiency", 0.9),
+                            efficiency2=1.0,
+                            p_nom=charge_p_nom,
+                            lifetime=1,
+                        ),
+                        index=names,
+                    )
+                )
+                links_t["p_max_pu"].append(avail_profile[nodes].set_axis(names, axis=1))
+
+            if options["bev_dsm"] and settings.get("bev_dsm", False):
+                names = nodes + f" battery storage {segment}"
+                stores.append(
+                    pd.DataFrame(
+                        dict(
+                            bus=battery_buses,
+                            carrier=f"battery storage {segment}",
+                            e_cyclic=True,
+                            e_nom=cars
+                            * options.get("bev_energy", 0.05)
+                            * options["bev_availability"]
+                            * share,
+                            e_max_pu=1,
+                            lifetime=15,
+                        ),
+                        index=names,
+                    )
+                )
+                stores_t.append(dsm_profile[nodes].set_axis(names, axis=1))
 
-def add_ice_cars(n, nodes, p_set, ice_share, temperature,
-                           car_efficiency, suffix,
-                           transport_type="light"
-                           ):
+    buses = pd.concat(buses)
+    links = pd.concat(links)
 
-    add_carrier_buses(n, "oil")
+    carriers = pd.Index([f"land transport demand {segment}" for segment in segments])
+    if (buses.carrier == "Li ion").any() and "Li ion" not in n.carriers.index:
+        carriers = carriers.append(pd.Index(["Li ion"]))
+    n.madd("Carrier", carriers)
 
-    # temperature corrected efficiency
-    efficiency = get_temp_efficency(
-        car_efficiency,
-        temperature,
-        options["transport_heating_deadband_lower"],
-        options["transport_heating_deadband_upper"],
-        options["ICE_lower_degree_factor"],
-        options["ICE_upper_degree_factor"],
-    )
+    if links.bus0.isin(spatial.oil.nodes).any():
+        add_carrier_buses(n, "oil")
 
-    p_nom = ice_share * p_set.div(efficiency).max()
+    n.madd("Bus", buses.index, **buses)
 
-    profile = p_set.div(efficiency) / p_set.div(efficiency).max()
+    p_set = pd.concat(loads, axis=1)
+    n.madd(
+        "Load",
+        p_set.columns,
+        bus=p_set.columns,
+        carrier=buses.carrier[p_set.columns],
+        p_set=p_set,
+    )
 
     n.madd(
         "Link",
-        nodes,
-        suffix=suffix,
-        bus0=spatial.oil.nodes,
-        bus1=nodes + f" land transport {transport_type}",
-        bus2=["co2 atmosphere"],
-        carrier=suffix[1:],
-        efficiency=efficiency,
-        efficiency2=costs.at["oil", "CO2 intensity"],
-        p_nom_extendable=False,
-        p_nom=p_nom,
-        p_min_pu=profile,
-        p_max_pu=profile,
-        lifetime=1,
+        links.index,
+        **links,
+        p_min_pu=pd.concat(links_t["p_min_pu"], axis=1),
+        p_max_pu=pd.concat(links_t["p_max_pu"], axis=1),
+    )
+    n.import_series_from_dataframe(
+        pd.concat(links_t["efficiency"], axis=1), "Link", "efficiency"
     )
 
+    if stores:
+        stores = pd.concat(stores)
+        n.madd("Store", stores.index, **stores, e_min_pu=pd.concat(stores_t, axis=1))
 
-car_keys = {"fuel_cell": ['FCV Bus city',
-                      'FCV Coach',
-                      'FCV Truck Semi-Trailer max 50 tons',
-                       'FCV Truck Solo max 26 tons',
-                       'FCV Truck Trailer max 56 tons'],
-        "ice": ['Diesel Bus city', 'Diesel Coach',
-               'Diesel Truck Semi-Trailer max 50 tons',
-               'Diesel Truck Solo max 26 tons',
-               'Diesel Truck Trailer max 56 tons'],
-        "electric": ['BEV Bus city', 'BEV Coach',
-                     'BEV Truck Semi-Trailer max 50 tons',
-               'BEV Truck Solo max 26 tons',
-               'BEV Truck Trailer max 56 tons']}
-
-
-def get_car_efficiencies():
-    car_efficiencies =  pd.DataFrame()
-    engine_types = ["fuel_cell", "electric", "ice"]
-    for engine in engine_types:
-        car_efficiencies.loc[engine, "light"] = options[f"transport_{engine}_efficiency"]["light"]
-        # heavy
-        car_efficiency = costs.loc[car_keys[engine], "efficiency"].mean()
-        # convert kWh/km in MWh per 100 km
-        car_efficiency = (1/(1e2*car_efficiency))*1e3
-        car_efficiencies.loc[engine, "heavy"] = car_efficiency
-        
-    return car_efficiencies
-    
-    
-def add_land_transport(n, costs):
-    # TODO options?
+    if endogenous:
+        adjust_endogenous_transport(n, segments, car_efficiencies)
 
-    logger.info("Add land transport")
-    
-    nodes = spatial.nodes
-    
-    # read in transport demand in units driven km [100 km]
-    transport = pd.read_csv(
-        snakemake.input.transport_demand, index_col=0, parse_dates=True,
-        header = [0,1]
-    ).reindex(columns=nodes, level=1)
-    car_cols = ['Number Passenger cars', 'Number Powered 2-wheelers',
-               'Number Light duty vehicles',
-               'Number Motor coaches, buses and trolley buses',
-               'Number Heavy duty vehicles']
-    number_cars = pd.read_csv(snakemake.input.transport_data, index_col=0)[
-        car_cols
-    ]
-    avail_profile = pd.read_csv(
-        snakemake.input.avail_profile, index_col=0, parse_dates=True
-    )
-    dsm_profile = pd.read_csv(
-        snakemake.input.dsm_profile, index_col=0, parse_dates=True
-    )
 
-    # exogenous share of passenger car type
-    engine_types = ["fuel_cell", "electric", "ice"]
-    transport_types = transport.columns.levels[0]
-    endogenous = options["endogenous_transport"]
-    
-    shares = pd.DataFrame()
-    car_efficiencies =  get_car_efficiencies()
-    for engine in engine_types:
-        for transport_type in transport_types:
-            shares.loc[engine, transport_type] = get(options[f"land_transport_{engine}_share"][transport_type],
-                                 investment_year)
-            if not endogenous:
-                logger.info(f"{engine} {transport_type} share: {shares.loc[engine, transport_type]*100}%")
-    
-    
-    
-    if not endogenous:
-        check_land_transport_shares(shares)
-    else:
-        logger.info("Endogenous optimisation of land transport sector")
-        # todo make this nicer
-        shares.loc[:,:] = 1/3
-    
-    # temperature for correction factor for heating/cooling
-    temperature = xr.open_dataarray(snakemake.input.temp_air_total).to_pandas()
-    
-    # respective columns for light and heavy duty
-    car_cols = {"light" :  ['Number Passenger cars',
-                            'Number Powered 2-wheelers',
-                            'Number Light duty vehicles'],
-                "heavy": ['Number Motor coaches, buses and trolley buses',
-                          'Number Heavy duty vehicles']
-                }
-    
-    
-    for transport_type in transport_types:
-        # Add load for transport demand
-        n.add("Carrier", f"land transport demand {transport_type}")
-    
+def add_transport_slack(n, buses_i, slack):
+    """
+    Add slack generators for positive and negative deviations from the land
+    transport demand.
+
+    By default, the slack is measured in the units of the transport buses
+    and bounded by ``max_share`` of the peak demand at each bus, with a
+    penalty of ``penalty`` per unit. With ``scaled: false``, the previous
+    formulation measuring the slack in thousandths of a unit with a bound of
+    1e9 is used.
+    """
+    if not slack.get("scaled", True):
+        # add dummy generator only needed for solving with glpk with higher solver tolerance
         n.madd(
-            "Bus",
-            nodes,
-            location=nodes,
-            suffix=f" land transport {transport_type}",
-            carrier=f"land transport demand {transport_type}",
-            unit="100 km",
+            "Generator",
+            buses_i,
+            " load",
+            bus=buses_i,
+            carrier="load",
+            sign=1e-3,  # Adjust sign to measure p and p_nom in kW instead of MW
+            marginal_cost=1e2,  # Eur/kWh
+            p_nom=1e9,  # kW
         )
-    
-        p_set = transport[transport_type]
-        carrier = carrier=f"land transport demand {transport_type}"
-        
-        if carrier in options["vary_demand"].keys():
-            factor = get(options["vary_demand"][carrier], investment_year)
-            logger.info(f"Vary {carrier} by factor {factor} in {investment_year}")
-        # add demand
+
         n.madd(
-            "Load",
-            nodes,
-            suffix=f" land transport {transport_type}",
-            bus=nodes + f" land transport {transport_type}",
-            carrier=carrier,
-            p_set=factor*p_set,
+            "Generator",
+            buses_i,
+            " load negative",
+            bus=buses_i,
+            carrier="load",
+            marginal_cost=-1e2,
+            sign=1e-3,  # Adjust sign to measure p and p_nom in kW instead of MW
+            p_nom=1e9,
+            p_max_pu=0,
+            p_min_pu=-1,
         )
+        return
 
+    max_share = slack.get("max_share", 1.0)
+    if not max_share:
+        return
 
-        # electric vehicles
-        if shares.loc["electric", transport_type] > 0:
-            
-            car_efficiency = car_efficiencies.loc["electric",transport_type]
-            
-            cols = car_cols[transport_type]
-            add_EVs(
-                n,
-                nodes,
-                avail_profile,
-                dsm_profile,
-                transport[transport_type],
-                shares.loc["electric", transport_type],
-                number_cars[cols].sum(axis=1),
-                temperature,
-                car_efficiency,
-                suffix=f" land transport EV {transport_type}",
-                transport_type=transport_type
-            )
-        
-        
-        # fuel cell vehicles
-        if shares.loc["fuel_cell", transport_type] > 0:
-            
-            car_efficiency = car_efficiencies.loc["fuel_cell", transport_type]
-            add_fuel_cell_cars(n, nodes, transport[transport_type],
-                               shares.loc["fuel_cell", transport_type],
-                               temperature,
-                               car_efficiency,
-                               suffix=f" land transport fuel cell {transport_type}",
-                               transport_type=transport_type)
-        
-        # internal combustion cars
-        if shares.loc["ice", transport_type]>0:
-            
-            car_efficiency = car_efficiencies.loc["ice", transport_type]
-            add_ice_cars(n, nodes, transport[transport_type],
-                         shares.loc["ice", transport_type],
-                         temperature, car_efficiency,
-                         suffix=f" land transport oil {transport_type}",
-                         transport_type=transport_type
-                         )
-            
-    if endogenous:
-        adjust_endogenous_transport(n)
-
-
-def adjust_endogenous_transport(n):
-
-    logger.info("Assume endogenous land transport")
-    carrier = [
-        "land transport EV light",
-        "land transport EV heavy",
-        "land transport oil light",
-        "land transport oil heavy",
-        "land transport fuel cell light",
-        "land transport fuel cell heavy",
-        "BEV charger light",
-        "BEV charger heavy",
-        "V2G",
-    ]
-
-    links_i = n.links[n.links.carrier.isin(carrier)].index
-    n.links.loc[links_i, "p_nom_extendable"] = True
-    n.links.loc[links_i, "lifetime"] = 15
-
-    store_carrier = ["battery storage", "Li ion"]
-    store_i = n.stores[n.stores.carrier.isin(store_carrier)].index
-    n.stores.loc[store_i, "e_nom_extendable"] = True
+    loads = n.loads[n.loads.bus.isin(buses_i)]
+    peak = n.loads_t.p_set[loads.index].max().groupby(loads.bus).sum()
+    p_nom = max_share * peak.reindex(buses_i, fill_value=0.0)
+    penalty = slack.get("penalty", 1e5)
 
-    # costs todo
-    # assume here for all of Europe
-    # average driving distance
-    # passenger cars EU28 JRC 2015 11 360 km /year and car = 113.6 100km /year
-    light_100km_per_vehicle = 113.6
-    # mean of buses and heavy duty freight
-    heavy_100km_per_vehicle = (396.783 + 172.843)/2
-    
-    engine_types = ["fuel_cell", "electric", "ice"]
-    transport_types = ["light", "heavy"]
-    car_efficiencies =  get_car_efficiencies()
-    # EV --------------------------
-    cost_EV = (costs.loc["Battery electric (passenger cars)", "fixed"]
-               / light_100km_per_vehicle / car_efficiencies.loc["electric", "light"])
-    
-    cost_Etruck = (costs.loc[car_keys["electric"], "fixed"].mean()
-                   / heavy_100km_per_vehicle /
-                   car_efficiencies.loc["electric", "heavy"])
-    # FCE ----------------------------
-    cost_FCE = (costs.loc["Hydrogen fuel cell (passenger cars)", "fixed"]
-                / light_100km_per_vehicle
-                / car_efficiencies.loc["fuel_cell", "light"])
-    cost_FCtruck = (costs.loc[car_keys["fuel_cell"], "fixed"].mean()
-                    / heavy_100km_per_vehicle
-                    / car_efficiencies.loc["fuel_cell", "heavy"])
-
-    # ICE ---------------------------------------------------------
-    cost_ICE = (costs.at["Liquid fuels ICE (passenger cars)", "fixed"]
-                / light_100km_per_vehicle
-                / car_efficiencies.loc["ice", "light"])
-    cost_ICtruck = (costs.loc[car_keys["ice"], "fixed"].mean()
-                    / heavy_100km_per_vehicle
-                    / car_efficiencies.loc["ice", "heavy"])
-    # cost in unit input depending on car type
-    costs_car_type = {
-        "land transport EV light": cost_EV,
-        "land transport EV heavy": cost_Etruck,
-        'land transport fuel cell light': cost_FCE,
-        'land transport fuel cell heavy': cost_FCtruck,
-        'land transport oil light': cost_ICE,
-        'land transport oil heavy': cost_ICtruck,
-            
-    }
-
-    # add dummy generator only needed for solving with glpk with higher solver tolerance
-    # n.add("Carrier", "dummy transport", color="#dd2e23", nice_name="Dummy transport")
-    buses_i = n.buses[n.buses.carrier.str.contains("land transport demand")].index
     n.madd(
         "Generator",
         buses_i,
         " load",
         bus=buses_i,
         carrier="load",
-        sign=1e-3,  # Adjust sign to measure p and p_nom in kW instead of MW
-        marginal_cost=1e2,  # Eur/kWh
-        p_nom=1e9,  # kW
+        marginal_cost=penalty,
+        p_nom=p_nom.values,
     )
 
     n.madd(
@@ -2005,32 +1903,52 @@ def adjust_endogenous_transport(n):
         " load negative",
         bus=buses_i,
         carrier="load",
-        marginal_cost=-1e2,
-        sign=1e-3,  # Adjust sign to measure p and p_nom in kW instead of MW
-        p_nom=1e9,
+        marginal_cost=-penalty,
+        p_nom=p_nom.values,
         p_max_pu=0,
         p_min_pu=-1,
-        #sign=-1,
     )
 
+
+def adjust_endogenous_transport(n, segments, car_efficiencies):
+
+    logger.info("Assume endogenous land transport")
+    carrier = [
+        f"land transport {label} {segment}"
+        for segment in segments
+        for label in LAND_TRANSPORT_ENGINES.values()
+    ]
+    carrier += [f"BEV charger {segment}" for segment in segments]
+    carrier += [f"V2G {segment}" for segment in segments]
+
+    links_i = n.links[n.links.carrier.isin(carrier)].index
+    n.links.loc[links_i, "p_nom_extendable"] = True
+    n.links.loc[links_i, "lifetime"] = 15
+
+    store_carrier = [f"battery storage {segment}" for segment in segments]
+    store_i = n.stores[n.stores.carrier.isin(store_carrier)].index
+    n.stores.loc[store_i, "e_nom_extendable"] = True
+
+    # cost in unit input depending on car type, assume average driving
+    # distance per vehicle and year (in 100 km) for all of Europe
+    costs_car_type = {
+        f"land transport {label} {segment}": (
+            costs.loc[settings["costs"][engine], "fixed"].mean()
+            / settings["km_per_vehicle"]
+            / car_efficiencies.loc[engine, segment]
+        )
+        for segment, settings in segments.items()
+        for engine, label in LAND_TRANSPORT_ENGINES.items()
+    }
+
+    buses_i = n.buses[n.buses.carrier.str.contains("land transport demand")].index
+    add_transport_slack(n, buses_i, options.get("transport_slack", {}))
+
     for car_type, cost in costs_car_type.items():
         car_i = n.links[n.links.carrier == car_type].index
         n.links.loc[car_i, "capital_cost"] = cost
-        # if car_type == 'land transport EV heavy' :
-        #     VOM = (costs.loc[car_keys["electric"], "VOM"].mean()
-        #            *100/ car_efficiencies.loc["electric", "heavy"])
-        #     n.links.loc[car_i, "marginal_cost"] = VOM
-        # elif car_type =='land transport fuel cell heavy':
-        #     VOM = (costs.loc[car_keys["fuel_cell"], "VOM"].mean()
-        #            *100/ car_efficiencies.loc["fuel_cell", "heavy"])
-        #     n.links.loc[car_i, "marginal_cost"] = VOM
-        # elif car_type =='land transport oil heavy':
-        #     VOM = (costs.loc[car_keys["ice"], "VOM"].mean()
-        #            *100/ car_efficiencies.loc["ice", "heavy"])
-        #     n.links.loc[car_i, "marginal_cost"] = VOM
-            
-        
-        
+
+
 def build_heat_demand(n):
     heat_demand_shape = (
         xr.open_dataset(snakemake.input.hourly_heat_demand_total)
@@ -3966,7 +3884,7 @@ def cluster_heat_buses(n):
 
 
 def apply_time_segmentation(
-    n, segments, solver_name="cbc", overwrite_time_dependent=True
+    n, segments, solver_name="cbc", overwrite_time_dependent=True, cache_dir=None
 ):
     """
     Aggregating time series to segments with different lengths.
@@ -3978,62 +3896,31 @@ def apply_time_segmentation(
         solver_name: (str) name of solver
         overwrite_time_dependent: (bool) overwrite time dependent data of pypsa network
         with typical time series created by tsam
+        cache_dir: (str) directory in which segmentations are cached
     """
-    try:
-        import tsam.timeseriesaggregation as tsam
-    except ImportError:
-        raise ModuleNotFoundError(
-            "Optional dependency 'tsam' not found." "Install via 'pip install tsam'"
-        )
-
     # get all time-dependent data
-    columns = pd.MultiIndex.from_tuples([], names=["component", "key", "asset"])
-    raw = pd.DataFrame(index=n.snapshots, columns=columns)
-    for c in n.iterate_components():
-        for attr, pnl in c.pnl.items():
-            # exclude e_min_pu which is used for SOC of EVs in the morning
-            if not pnl.empty and attr != "e_min_pu":
-                df = pnl.copy()
-                df.columns = pd.MultiIndex.from_product([[c.name], [attr], df.columns])
-                raw = pd.concat([raw, df], axis=1)
-
-    # normalise all time-dependent data
-    annual_max = raw.max().replace(0, 1)
-    raw = raw.div(annual_max, level=0)
+    # exclude e_min_pu which is used for SOC of EVs in the morning
+    raw = get_time_series_matrix(n, exclude_attrs=["e_min_pu"])
 
     # get representative segments
-    agg = tsam.TimeSeriesAggregation(
-        raw,
-        hoursPerPeriod=len(raw),
-        noTypicalPeriods=1,
-        noSegments=int(segments),
-        segmentation=True,
-        solver=solver_name,
+    sn_weightings, segmented = segment_time_series(
+        raw, segments, solver_name=solver_name, cache_dir=cache_dir
     )
-    segmented = agg.createTypicalPeriods()
-
-    weightings = segmented.index.get_level_values("Segment Duration")
-    offsets = np.insert(np.cumsum(weightings[:-1]), 0, 0)
-    timesteps = [raw.index[0] + pd.Timedelta(f"{offset}h") for offset in offsets]
-    snapshots = pd.DatetimeIndex(timesteps)
-    sn_weightings = pd.Series(
-        weightings, index=snapshots, name="weightings", dtype="float64"
-    )
-    logger.info(f"Distribution of snapshot durations:\n{weightings.value_counts()}")
+    logger.info(f"Distribution of snapshot durations:\n{sn_weightings.value_counts()}")
 
     n.set_snapshots(sn_weightings.index)
     n.snapshot_weightings = n.snapshot_weightings.mul(sn_weightings, axis=0)
 
     # overwrite time-dependent data with timeseries created by tsam
     if overwrite_time_dependent:
-        values_t = segmented.mul(annual_max).set_index(snapshots)
+        values_t = segmented.astype(float)
         for component, key in values_t.columns.droplevel(2).unique():
             n.pnl(component)[key] = values_t[component, key]
 
     return n
 
 
-def set_temporal_aggregation(n, resolution, solver_name):
+def set_temporal_aggregation(n, resolution, solver_name, cache_dir=None):
     """
     Aggregate network temporally.
     """
@@ -4051,7 +3938,9 @@ def set_temporal_aggregation(n, resolution, solver_name):
     elif "seg" in resolution.lower():
         segments = int(resolution[:-3])
         logger.info("Use temporal segmentation with %s segments", segments)
-        n = apply_time_segmentation(n, segments, solver_name=solver_name)
+        n = apply_time_segmentation(
+            n, segments, solver_name=solver_name, cache_dir=cache_dir
+        )
 
     # temporal averaging
     elif "h" in resolution.lower():
@@ -4113,39 +4002,147 @@ def lossy_bidirectional_links(n, carrier, efficiencies={}):
 
 def adjust_transport_temporal_agg(n):
 
-    engine_types = {
-        "fuel_cell": "land transport fuel cell",
-        "electric": "land transport EV",
-        "ice": "land transport oil",
-    }
+    for segment in options["land_transport_segments"]:
+        p_set = n.loads_t.p_set.loc[
+            :, n.loads.carrier == f"land transport demand {segment}"
+        ]
+        if p_set.empty:
+            continue
+        for engine, label in LAND_TRANSPORT_ENGINES.items():
+
+            share = get(
+                options[f"land_transport_{engine}_share"][segment], investment_year
+            )
 
-    
-    for transport_type in ["light", "heavy"]:
-        p_set = n.loads_t.p_set.loc[:, n.loads.carrier == f"land transport demand {transport_type}"]
-        for engine, carrier in engine_types.items():
-            
-            share = get(options[f"land_transport_{engine}_share"][transport_type],
-                        investment_year)
-    
             if share == 0: continue
-                
-            links_i = n.links[n.links.carrier == carrier + f" {transport_type}"].index
+
+            links_i = n.links[
+                n.links.carrier == f"land transport {label} {segment}"
+            ].index
             efficiency = n.links_t.efficiency.loc[:, links_i]
 
             p_set.columns = efficiency.columns
             p_nom = share * p_set.div(efficiency).max()
             profile = p_set.div(efficiency) / p_set.div(efficiency).max()
-    
+
             n.links.loc[links_i, "p_nom"] = p_nom
-            # TODO just for testing
-            # if engine == "electric": 
-            #     n.links_t.p_max_pu[links_i] = 1
-            #     n.links_t.p_min_pu[links_i] = 0
-            # else:
             n.links_t.p_max_pu[links_i] = profile
             n.links_t.p_min_pu[links_i] = profile
 
 
+def remove_land_transport(n):
+    """
+    Remove the land transport buses, EV batteries and all components attached
+    to them.
+    """
+    buses_i = n.buses.index[
+        n.buses.carrier.str.startswith("land transport demand")
+        | n.buses.index.str.contains(" EV battery ")
+    ]
+    for c in n.one_port_components:
+        df = n.df(c)
+        n.mremove(c, df.index[df.bus.isin(buses_i)])
+    links_i = n.links.index[n.links[["bus0", "bus1"]].isin(buses_i).any(axis=1)]
+    n.mremove("Link", links_i)
+    n.mremove("Bus", buses_i)
+    carriers_i = n.carriers.index[
+        n.carriers.index.str.startswith("land transport demand")
+    ]
+    n.mremove("Carrier", carriers_i)
+
+
+def resample_to_snapshots(df, snapshots, resolution, attr):
+    """
+    Aggregate hourly time series to the snapshots of a temporally aggregated
+    network in the same way as :func:`set_temporal_aggregation`.
+    """
+    if not resolution or "sn" in resolution.lower():
+        return df.reindex(snapshots)
+
+    groups = snapshots[snapshots.searchsorted(df.index, side="right") - 1]
+    grouped = df.groupby(groups)
+    if attr == "e_max_pu":
+        return grouped.min()
+    elif attr == "e_min_pu":
+        return grouped.max()
+    return grouped.mean()
+
+
+def vary_demand_factor(options, carrier):
+    return get(options["vary_demand"].get(carrier, 1.0), investment_year)
+
+
+def patch_land_transport(n, costs, snapshots, resolution, base_options, adjustments):
+    """
+    Replace the land transport of a prepared sector network.
+
+    The land transport is removed and rebuilt with the current options on an
+    empty network with the hourly ``snapshots``, whose time series are then
+    aggregated to the snapshots of ``n``. The cost and potential
+    ``adjustments`` and transmission losses are applied to the rebuilt
+    components as in the full build. Shipping demand is rescaled relative to
+    the ``vary_demand`` of the ``base_options`` the network was built with.
+    """
+    logger.info("Patch land transport and shipping demand of base network")
+
+    remove_land_transport(n)
+
+    m = pypsa.Network()
+    m.set_snapshots(snapshots)
+    import_components_from_dataframe(m, n.carriers, "Carrier")
+    import_components_from_dataframe(m, n.buses, "Bus")
+
+    add_land_transport(m, costs)
+
+    # only the rebuilt components, the base network is already adjusted
+    maybe_adjust_costs_and_potentials(m, adjustments)
+    for k, v in options["transmission_efficiency"].items():
+        lossy_bidirectional_links(m, k, v)
+
+    components = ["Carrier", "Bus", "Load", "Generator", "Link", "Store"]
+    for c in m.iterate_components(components):
+        df = c.df.drop(n.df(c.name).index, errors="ignore")
+        import_components_from_dataframe(n, df, c.name)
+        for attr, pnl in c.pnl.items():
+            if not pnl.empty:
+                pnl = resample_to_snapshots(pnl, n.snapshots, resolution, attr)
+                n.import_series_from_dataframe(pnl, c.name, attr)
+
+    adjust_transport_temporal_agg(n)
+
+    links = n.links.loc[m.links.index]
+
+    if options["no_pmaxpu"]:
+        links_i = links.index[links.carrier.str.contains("land transport")]
+        common_i = n.links_t.p_max_pu.columns.intersection(links_i)
+        n.links_t.p_max_pu.loc[:, common_i] = 1
+
+    if options["electricity_distribution_grid"]:
+        bevs = links.index[links.carrier.str.contains("BEV charger")]
+        n.links.loc[bevs, "bus0"] += " low voltage"
+        v2gs = links.index[links.carrier.str.contains("V2G")]
+        n.links.loc[v2gs, "bus1"] += " low voltage"
+
+    for parameter in options["vary"].keys():
+        for carrier in options["vary"][parameter].keys():
+            links_i = links.index[links.carrier == carrier]
+            n.links.loc[links_i, parameter] *= options["vary"][parameter][carrier]
+
+    factor = vary_demand_factor(options, "shipping") / vary_demand_factor(
+        base_options, "shipping"
+    )
+    if factor != 1:
+        logger.info(f"Vary shipping demand by factor {factor} relative to base")
+        shipping_carriers = [
+            "shipping",
+            "shipping oil",
+            "shipping methanol",
+            "H2 for shipping",
+        ]
+        loads_i = n.loads.index[n.loads.carrier.isin(shipping_carriers)]
+        n.loads.loc[loads_i, "p_set"] *= factor
+
+
 # %%
 if __name__ == "__main__":
     if "snakemake" not in globals():
@@ -4170,7 +4167,12 @@ if __name__ == "__main__":
 
     investment_year = int(snakemake.wildcards.planning_horizons[-4:])
 
-    n = pypsa.Network(snakemake.input.network)
+    transport_sweep = "base_network" in snakemake.input.keys()
+
+    if transport_sweep:
+        n = load_network(snakemake.input.base_network)
+    else:
+        n = load_network(snakemake.input.network)
 
     pop_layout = pd.read_csv(snakemake.input.clustered_pop_layout, index_col=0)
     nhours = n.snapshot_weightings.generators.sum()
@@ -4190,69 +4192,124 @@ if __name__ == "__main__":
     )
     pop_weighted_energy_totals.update(pop_weighted_heat_totals)
 
-    patch_electricity_network(n)
+    profile = stage_profiler()
+
+    if transport_sweep:
+        spatial = define_spatial(pop_layout.index, options)
+
+        with xr.open_dataset(snakemake.input.network) as ds:
+            snapshots = pd.DatetimeIndex(ds["snapshots_snapshot"].values)
+
+        with profile("patch_land_transport", n):
+            patch_land_transport(
+                n,
+                costs,
+                snapshots,
+                snakemake.params.time_resolution,
+                snakemake.params.transport_sweep_base_sector,
+                snakemake.params["adjustments"],
+            )
+
+        n.meta = dict(snakemake.config, **dict(wildcards=dict(snakemake.wildcards)))
+
+        sanitize_carriers(n, snakemake.config)
+        sanitize_locations(n)
+
+        export_network(n, snakemake.output[0])
+
+        profile.to_json(snakemake.output.stages)
+        sys.exit(0)
+
+    with profile("patch_electricity_network", n):
+        patch_electricity_network(n)
 
     spatial = define_spatial(pop_layout.index, options)
 
     if snakemake.params.foresight in ["myopic", "perfect"]:
-        add_lifetime_wind_solar(n, costs)
+        with profile("add_lifetime_wind_solar", n):
+            add_lifetime_wind_solar(n, costs)
 
-        conventional = snakemake.params.conventional_carriers
-        for carrier in conventional:
-            add_carrier_buses(n, carrier)
+            conventional = snakemake.params.conventional_carriers
+            for carrier in conventional:
+                add_carrier_buses(n, carrier)
 
-    add_eu_bus(n)
+    with profile("add_eu_bus", n):
+        add_eu_bus(n)
 
-    add_co2_tracking(n, costs, options)
+    with profile("add_co2_tracking", n):
+        add_co2_tracking(n, costs, options)
 
-    add_generation(n, costs)
+    with profile("add_generation", n):
+        add_generation(n, costs)
 
-    add_storage_and_grids(n, costs)
+    with profile("add_storage_and_grids", n):
+        add_storage_and_grids(n, costs)
 
     if options["transport"]:
-        add_land_transport(n, costs)
+        with profile("add_land_transport", n):
+            add_land_transport(n, costs)
 
     if options["heating"]:
-        add_heat(n, costs)
+        with profile("add_heat", n):
+            add_heat(n, costs)
 
     if options["biomass"]:
-        add_biomass(n, costs)
+        with profile("add_biomass", n):
+            add_biomass(n, costs)
 
     if options["ammonia"]:
-        add_ammonia(n, costs)
+        with profile("add_ammonia", n):
+            add_ammonia(n, costs)
 
     if options["industry"]:
-        add_industry(n, costs)
+        with profile("add_industry", n):
+            add_industry(n, costs)
 
     if options["heating"]:
-        add_waste_heat(n)
+        with profile("add_waste_heat", n):
+            add_waste_heat(n)
 
     if options["agriculture"]:  # requires H and I
-        add_agriculture(n, costs)
+        with profile("add_agriculture", n):
+            add_agriculture(n, costs)
 
     if options["dac"]:
-        add_dac(n, costs)
+        with profile("add_dac", n):
+            add_dac(n, costs)
 
     if not options["electricity_transmission_grid"]:
-        decentral(n)
+        with profile("decentral", n):
+            decentral(n)
 
     if not options["H2_network"]:
-        remove_h2_network(n)
+        with profile("remove_h2_network", n):
+            remove_h2_network(n)
 
     if options["co2network"]:
-        add_co2_network(n, costs)
+        with profile("add_co2_network", n):
+            add_co2_network(n, costs)
 
     if options["allam_cycle"]:
-        add_allam(n, costs)
+        with profile("add_allam", n):
+            add_allam(n, costs)
         
     if options['electrobiofuels']:
-        add_electrobiofuels(n)
+        with profile("add_electrobiofuels", n):
+            add_electrobiofuels(n)
 
     solver_name = snakemake.config["solving"]["solver"]["name"]
     resolution = snakemake.params.time_resolution
-    n = set_temporal_aggregation(n, resolution, solver_name)
+    with profile("set_temporal_aggregation", n) as stage:
+        n = set_temporal_aggregation(
+            n,
+            resolution,
+            solver_name,
+            cache_dir=snakemake.params.get("segmentation_cache"),
+        )
+        stage.n = n
 
-    adjust_transport_temporal_agg(n)
+    with profile("adjust_transport_temporal_agg", n):
+        adjust_transport_temporal_agg(n)
     
     if options["no_pmaxpu"]:
         link_i = n.links[n.links.carrier.str.contains("land transport")].index
@@ -4277,7 +4334,8 @@ if __name__ == "__main__":
         limit = co2_cap.loc[investment_year]
     else:
         limit = get(co2_budget, investment_year)
-    add_co2limit(n, options, nyears, limit)
+    with profile("add_co2limit", n):
+        add_co2limit(n, options, nyears, limit)
 
     maxext = snakemake.params["lines"]["max_extension"]
     if maxext is not None:
@@ -4287,21 +4345,27 @@ if __name__ == "__main__":
     logger.info(f"Transmission lines: {ll_type} with factor {factor}")
     n.global_constraints.drop(f"l{ll_type}_limit", inplace=True, errors="ignore")
     costs["capital_cost"] = costs["fixed"]
-    n = set_transmission_limit(n, ll_type, factor, costs, nyears)
+    with profile("set_transmission_limit", n) as stage:
+        n = set_transmission_limit(n, ll_type, factor, costs, nyears)
+        stage.n = n
 
     if options["electricity_distribution_grid"]:
-        insert_electricity_distribution_grid(n, costs)
+        with profile("insert_electricity_distribution_grid", n):
+            insert_electricity_distribution_grid(n, costs)
 
     maybe_adjust_costs_and_potentials(n, snakemake.params["adjustments"])
 
     if options["gas_distribution_grid"]:
-        insert_gas_distribution_costs(n, costs)
+        with profile("insert_gas_distribution_costs", n):
+            insert_gas_distribution_costs(n, costs)
 
     if options["electricity_grid_connection"]:
-        add_electricity_grid_connection(n, costs)
+        with profile("add_electricity_grid_connection", n):
+            add_electricity_grid_connection(n, costs)
 
-    for k, v in options["transmission_efficiency"].items():
-        lossy_bidirectional_links(n, k, v)
+    with profile("lossy_bidirectional_links", n):
+        for k, v in options["transmission_efficiency"].items():
+            lossy_bidirectional_links(n, k, v)
         
     for parameter in options["vary"].keys():
         for carrier in options["vary"][parameter].keys():
@@ -4325,11 +4389,14 @@ if __name__ == "__main__":
     )
 
     if options.get("cluster_heat_buses", False) and not first_year_myopic:
-        cluster_heat_buses(n)
+        with profile("cluster_heat_buses", n):
+            cluster_heat_buses(n)
 
     n.meta = dict(snakemake.config, **dict(wildcards=dict(snakemake.wildcards)))
 
     sanitize_carriers(n, snakemake.config)
     sanitize_locations(n)
 
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0])
+
+    profile.to_json(snakemake.output.stages)
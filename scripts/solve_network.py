@@ -26,12 +26,17 @@ Additionally, some extra constraints specified in :mod:`solve_network` are added
     the workflow for all scenarios in the configuration file (``scenario:``)
     based on the rule :mod:`solve_network`.
 """
+import hashlib
 import importlib
+import json
 import logging
 import os
 import re
 import sys
+import tempfile
+import time
 
+import linopy
 import numpy as np
 import pandas as pd
 import pypsa
@@ -40,11 +45,16 @@ import yaml
 from _benchmark import memory_logger
 from _helpers import (
     configure_logging,
+    export_network,
+    get_file_hash,
+    load_network,
     set_scenario_config,
     update_config_from_wildcards,
 )
+from add_brownfield import export_brownfield_state
 from pypsa.descriptors import get_activity_mask
 from pypsa.descriptors import get_switchable_as_dense as get_as_dense
+from pypsa.optimization.optimize import assign_duals, assign_solution, post_processing
 
 logger = logging.getLogger(__name__)
 pypsa.pf.logger.setLevel(logging.WARNING)
@@ -329,6 +339,156 @@ def add_retrofit_gas_boiler_constraint(n, snapshots):
     n.model.add_constraints(lhs == rhs, name="gas_retrofit")
 
 
+def presolve_fixed_flow_links(n):
+    """
+    Replace non-extendable links with fixed flow by equivalent loads.
+
+    Links with ``p_min_pu == p_max_pu`` and fixed ``p_nom`` (e.g. land
+    transport links with exogenous shares) have a fully determined flow. They
+    are removed from the network and their withdrawals and injections at every
+    port are added as time-varying loads. The removed links are kept in
+    ``n.presolved_links`` and restored after solving with
+    :func:`restore_presolved_links`.
+    """
+    if not n.investment_periods.empty:
+        logger.info("Skip presolving fixed-flow links for perfect foresight.")
+        return
+
+    links = n.links[~n.links.p_nom_extendable]
+    if "committable" in links.columns:
+        links = links[~links.committable.astype(bool)]
+    if links.empty:
+        return
+
+    p_min_pu = get_as_dense(n, "Link", "p_min_pu", inds=links.index)
+    p_max_pu = get_as_dense(n, "Link", "p_max_pu", inds=links.index)
+    fixed = np.isclose(p_min_pu, p_max_pu).all(axis=0)
+    fixed_i = links.index[fixed]
+
+    if fixed_i.empty:
+        return
+
+    logger.info(f"Presolve {len(fixed_i)} fixed-flow links into loads.")
+
+    p0 = p_max_pu[fixed_i].mul(n.links.loc[fixed_i, "p_nom"])
+
+    ports = [c[3:] for c in n.links.columns if c.startswith("bus") and c[3:].isdigit()]
+    flows = {}
+    loads = []
+    for port in ports:
+        bus = n.links.loc[fixed_i, f"bus{port}"]
+        connected_i = bus.index[bus.notnull() & (bus != "")]
+        if connected_i.empty:
+            continue
+        if port == "0":
+            p = p0[connected_i]
+        else:
+            eff = "efficiency" if port == "1" else f"efficiency{port}"
+            efficiency = get_as_dense(n, "Link", eff, inds=connected_i)
+            p = -p0[connected_i] * efficiency
+        flows[port] = p
+
+        names = connected_i + f" presolved bus{port}"
+        n.madd(
+            "Load",
+            names,
+            bus=bus[connected_i].values,
+            carrier=n.links.loc[connected_i, "carrier"].values,
+            p_set=p.set_axis(names, axis=1),
+        )
+        loads.extend(names)
+
+    # marginal costs of fixed flows are constant and are added to the objective
+    # after solving
+    offset = n.snapshot_weightings.objective @ p0.mul(
+        n.links.loc[fixed_i, "marginal_cost"]
+    ).sum(axis=1)
+
+    n.presolved_links = dict(
+        static=n.links.loc[fixed_i].copy(),
+        series={
+            attr: df[df.columns.intersection(fixed_i)].copy()
+            for attr, df in n.links_t.items()
+            if not df.columns.intersection(fixed_i).empty
+        },
+        flows=flows,
+        loads=pd.Index(loads),
+        objective_offset=offset,
+    )
+
+    n.mremove("Link", fixed_i)
+
+    # buses only connected to loads have no variables left, their balance is
+    # dropped if the fixed flows already satisfy it
+    other_buses = pd.Index(
+        np.concatenate(
+            [
+                n.df(c)[col].values
+                for c in (n.one_port_components | n.branch_components) - {"Load"}
+                for col in n.df(c).columns
+                if col == "bus" or (col.startswith("bus") and col[3:].isdigit())
+            ]
+        )
+    )
+    buses = pd.Index(n.loads.loc[loads, "bus"].unique()).difference(other_buses)
+    closed_i = n.loads.index[n.loads.bus.isin(buses)]
+    if not closed_i.empty:
+        p_set = get_as_dense(n, "Load", "p_set", inds=closed_i)
+        residual = p_set.T.groupby(n.loads.loc[closed_i, "bus"]).sum().T
+        balanced = residual.columns[np.isclose(residual, 0, atol=1e-6).all(axis=0)]
+        if len(balanced) < len(buses):
+            logger.warning(
+                "Fixed flows do not meet the demand at buses "
+                f"{buses.difference(balanced).tolist()}."
+            )
+        closed_i = closed_i[n.loads.loc[closed_i, "bus"].isin(balanced)]
+        original_i = closed_i.difference(loads)
+        n.presolved_links["closed_loads"] = dict(
+            static=n.loads.loc[original_i].copy(),
+            series={
+                attr: df[df.columns.intersection(original_i)].copy()
+                for attr, df in n.loads_t.items()
+                if not df.columns.intersection(original_i).empty
+            },
+            p=p_set[original_i],
+        )
+        n.mremove("Load", closed_i)
+
+
+def restore_presolved_links(n):
+    """
+    Re-add links removed by :func:`presolve_fixed_flow_links` together with
+    their flows and remove the auxiliary loads.
+    """
+    presolved = getattr(n, "presolved_links", None)
+    if presolved is None:
+        return
+
+    static = presolved["static"]
+    n.mremove("Load", presolved["loads"].intersection(n.loads.index))
+    if closed := presolved.get("closed_loads"):
+        n.import_components_from_dataframe(closed["static"], "Load")
+        for attr, df in closed["series"].items():
+            n.import_series_from_dataframe(df, "Load", attr)
+        n.loads_t.p = pd.concat([n.loads_t.p, closed["p"]], axis=1)
+
+    n.import_components_from_dataframe(static, "Link")
+    for attr, df in presolved["series"].items():
+        n.import_series_from_dataframe(df, "Link", attr)
+
+    n.links.loc[static.index, "p_nom_opt"] = static.p_nom
+    for port, p in presolved["flows"].items():
+        n.links_t[f"p{port}"] = pd.concat(
+            [n.links_t[f"p{port}"].drop(columns=p.columns, errors="ignore"), p],
+            axis=1,
+        ).reindex(n.snapshots)
+
+    if getattr(n, "objective", None) is not None:
+        n.objective += presolved["objective_offset"]
+
+    del n.presolved_links
+
+
 def prepare_network(
     n,
     solve_opts=None,
@@ -390,6 +550,9 @@ def prepare_network(
         n.set_snapshots(n.snapshots[:nhours])
         n.snapshot_weightings[:] = 8760.0 / nhours
 
+    if solve_opts.get("presolve_fixed_links"):
+        presolve_fixed_flow_links(n)
+
     if foresight == "myopic":
         add_land_use_constraint(n, planning_horizons, config)
 
@@ -407,60 +570,62 @@ def prepare_network(
 
 def add_endogenous_transport_constraints(n, snapshots):
     """
-    Add constraints to relate number of EVs to EV charger, V2G and DSM.
+    Add constraints to relate number of EVs to EV charger, V2G and DSM for each
+    land transport segment.
     """
-    # get index TODO only extendable
     link_ext = n.links[n.links.p_nom_extendable]
-    ev_i = link_ext[link_ext.carrier.str.contains("land transport EV")].index
-    bev_i = link_ext[link_ext.carrier.str.contains("BEV charger")].index
-    v2g_i = link_ext[link_ext.carrier.str.contains("V2G")].index
-    bev_dsm_i = n.stores[
-        (n.stores.carrier.str.contains("Li ion") & n.stores.e_nom_extendable)
-    ].index
-    
-    if ev_i.empty:
-        return
-    # factor
-    f = (
-        n.links.loc[ev_i, "p_nom"]
-        .rename(n.links.bus0)
-        .div(n.links.loc[bev_i, "p_nom"].rename(n.links.bus1))
-    )
+    store_ext = n.stores[n.stores.e_nom_extendable]
 
-    # variables
-    link_p_nom = n.model.variables.Link_p_nom
+    for segment in n.config["sector"]["land_transport_segments"]:
+        # components of each node, aligned by the EV battery bus
+        ev = link_ext[link_ext.carrier == f"land transport EV {segment}"]
+        if ev.empty:
+            continue
 
-    # constraint for BEV charger
-    lhs = link_p_nom.loc[ev_i] - (link_p_nom.loc[bev_i] * f.values)
-    n.model.add_constraints(lhs == 0, name="p_nom-EV-BEV")
-    
-    ev_light = link_ext[link_ext.carrier=="land transport EV light"].index
-    if not v2g_i.empty:
-        
-        # constraint for V2G
-        lhs = link_p_nom.loc[ev_light] - (link_p_nom.loc[v2g_i] * f[f.index.str.contains("light")].values)
-        n.model.add_constraints(lhs >= 0, name="p_nom-EV-V2G")
+        # variables
+        link_p_nom = n.model["Link-p_nom"]
+
+        ev_i = pd.Series(ev.index, ev.bus0)
+        bev = link_ext[link_ext.carrier == f"BEV charger {segment}"]
+        bev_i = pd.Series(bev.index, bev.bus1).reindex(ev_i.index)
+        v2g = link_ext[link_ext.carrier == f"V2G {segment}"]
+        v2g_i = pd.Series(v2g.index, v2g.bus0).reindex(ev_i.index).dropna()
+        dsm = store_ext[store_ext.carrier == f"battery storage {segment}"]
+        dsm_i = pd.Series(dsm.index, dsm.bus).reindex(ev_i.index).dropna()
 
-    if not bev_dsm_i.empty:
         # factor
-        f = (
-            n.links.loc[ev_light, "p_nom"]
-            .rename(n.links.bus0)
-            .div(n.stores.loc[bev_dsm_i, "e_nom"].rename(n.stores.bus))
-        )
+        f = n.links.p_nom[ev_i].values / n.links.p_nom[bev_i].values
+
+        # constraint for BEV charger
+        lhs = link_p_nom.loc[ev_i.values] - link_p_nom.loc[bev_i.values] * f
+        n.model.add_constraints(lhs == 0, name=f"p_nom-EV-BEV-{segment}")
+
+        if not v2g_i.empty:
+            # constraint for V2G
+            f_v2g = pd.Series(f, ev_i.index)[v2g_i.index].values
+            lhs = (
+                link_p_nom.loc[ev_i[v2g_i.index].values]
+                - link_p_nom.loc[v2g_i.values] * f_v2g
+            )
+            n.model.add_constraints(lhs >= 0, name=f"p_nom-EV-V2G-{segment}")
+
+        if not dsm_i.empty:
+            # factor
+            f_dsm = (
+                n.links.p_nom[ev_i[dsm_i.index]].values / n.stores.e_nom[dsm_i].values
+            )
 
-        store_e_nom = n.model.variables.Store_e_nom
+            # constraint for DSM, with the stores aligned to their EVs
+            store_e_nom = (
+                n.model["Store-e_nom"]
+                .loc[dsm_i.values]
+                .rename({"Store-ext": "Link-ext"})
+                .assign_coords({"Link-ext": ev_i[dsm_i.index].values})
+            )
+            lhs = link_p_nom.loc[ev_i[dsm_i.index].values] - store_e_nom * f_dsm
+            n.model.add_constraints(lhs >= 0, name=f"e_nom-EV-DSM-{segment}")
 
-        # constraint for DSM
-        lhs = link_p_nom.loc[ev_light] - (store_e_nom.loc[bev_dsm_i] * f.values)
-        n.model.add_constraints(lhs >= 0, name="e_nom-EV-DSM")
 
-    # TODO as a test remove p_nom
-    # links_i = n.links[(n.links.carrier.str.contains("transport"))
-    #                   & (n.links.p_nom_extendable)].index
-    # n.links.loc[links_i.union(v2g_i), "p_nom"] = 0
-    # n.stores.loc[bev_dsm_i, "e_nom"] = 0
-    
 def add_CCL_constraints(n, config):
     """
     Add CCL (country & carrier limit) constraint to the network.
@@ -929,13 +1094,443 @@ def extra_functionality(n, snapshots):
         custom_extra_functionality(n, snapshots, snakemake)
 
 
-def solve_network(n, config, solving, **kwargs):
+def add_load_shedding_to_model(n, marginal_cost=1e4):
+    """
+    Add load shedding variables to the already built model at all buses without
+    load shedding generator.
+
+    Like the load shedding generators of :func:`prepare_network`, load
+    shedding is measured in kW with marginal costs in EUR/kWh.
+    """
+    m = n.model
+    if "load_shedding" in m.variables:
+        return
+
+    balance = m.constraints["Bus-nodal_balance"]
+    buses_i = balance.indexes["Bus"].difference(
+        n.generators.query("carrier == 'load'").bus
+    )
+    if buses_i.empty:
+        return
+
+    sns = m.parameters.snapshots.to_index()
+    all_buses_i = balance.indexes["Bus"]
+    shedding = m.add_variables(
+        lower=0,
+        upper=1e9,
+        coords=[sns, all_buses_i],
+        name="load_shedding",
+        mask=pd.Series(all_buses_i.isin(buses_i), index=all_buses_i),
+    )
+    balance.lhs = balance.lhs + 1e-3 * shedding
+
+    weighting = n.snapshot_weightings.objective
+    if n._multi_invest:
+        weighting = weighting.mul(n.investment_period_weightings.objective, level=0)
+    cost = (shedding * (marginal_cost * weighting.loc[sns])).sum()
+    m.add_objective(m.objective.expression + cost, overwrite=True)
+
+
+def assign_load_shedding(n, marginal_cost=1e4):
+    """
+    Map the solution of the load shedding variables added by
+    :func:`add_load_shedding_to_model` to load shedding generators.
+    """
+    if "load_shedding" not in n.model.variables:
+        return
+
+    p = n.model["load_shedding"].solution.to_pandas().dropna(axis=1, how="all")
+    buses_i = p.columns
+
+    if "load" not in n.carriers.index:
+        n.add("Carrier", "load", color="#dd2e23", nice_name="Load shedding")
+    n.madd(
+        "Generator",
+        buses_i,
+        " load",
+        bus=buses_i,
+        carrier="load",
+        sign=1e-3,  # Adjust sign to measure p and p_nom in kW instead of MW
+        marginal_cost=marginal_cost,  # Eur/kWh
+        p_nom=1e9,  # kW
+    )
+    n.generators.loc[buses_i + " load", "p_nom_opt"] = 1e9
+    n.generators_t.p = pd.concat(
+        [n.generators_t.p, p.add_suffix(" load").reindex(n.snapshots)], axis=1
+    )
+
+
+def coefficient_ranges(m):
+    """
+    Get the smallest and largest absolute nonzero coefficients of a linopy
+    model per constraint (matrix and right-hand side), per variable (bounds)
+    and of the objective.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns ``min`` and ``max``, indexed by the kind of coefficient and
+        the name of the constraint or variable.
+    """
+
+    def extent(values):
+        values = np.abs(values[np.isfinite(values)])
+        values = values[values > 0]
+        if not values.size:
+            return np.nan, np.nan
+        return values.min(), values.max()
+
+    ranges = {}
+    for name in m.constraints:
+        con = m.constraints[name]
+        active = con.labels.values != -1
+        coeffs = con.coeffs.transpose(*con.labels.dims, "_term").values
+        terms = con.vars.transpose(*con.labels.dims, "_term").values != -1
+        ranges[("matrix", name)] = extent(coeffs[terms & active[..., None]])
+        ranges[("rhs", name)] = extent(con.rhs.values[active])
+    for name in m.variables:
+        var = m.variables[name]
+        active = var.labels.values != -1
+        bounds = np.concatenate([var.lower.values[active], var.upper.values[active]])
+        ranges[("bounds", name)] = extent(bounds)
+    objective = m.objective.coeffs.values[m.objective.vars.values != -1]
+    ranges[("objective", "objective")] = extent(objective)
+
+    index = pd.MultiIndex.from_tuples(ranges.keys(), names=["kind", "name"])
+    return pd.DataFrame(list(ranges.values()), index=index, columns=["min", "max"])
+
+
+def log_coefficient_ranges(n):
+    """
+    Log the coefficient ranges of the built model with the constraints and
+    variables at the extremes.
+    """
+    ranges = coefficient_ranges(n.model).dropna()
+    for kind, df in ranges.groupby(level=0):
+        df = df.droplevel(0)
+        logger.info(
+            f"Coefficient range of {kind}: [{df['min'].min():.0e}, {df['max'].max():.0e}] "
+            f"(min in {df['min'].idxmin()}, max in {df['max'].idxmax()})"
+        )
+
+
+# solving settings and options which do not change the built model
+CHECKPOINT_IGNORED = [
+    "solver",
+    "solver_options",
+    "tmpdir",
+    "mem_mb",
+    "runtime",
+    "predict_resources",
+    "report_coefficient_ranges",
+    "checkpoint",
+    "model_cache",
+    "io_api",
+]
+
+
+def solve_model(n, attempts, name, build_time=0.0, **kwargs):
+    """
+    Solve the already built model and record the attempt.
+    """
+    start = time.time()
+    status, condition = n.optimize.solve_model(**kwargs)
+    attempts.append(
+        dict(
+            attempt=name,
+            build_time=build_time,
+            solve_time=time.time() - start,
+            status=status,
+            condition=condition,
+            solver_options=dict(kwargs["solver_options"]),
+        )
+    )
+    logger.info(f"Solving attempt: {json.dumps(attempts[-1])}")
+    return status, condition
+
+
+# settings are applied cumulatively if the previous attempt failed
+FALLBACK_LADDER = [
+    ("tighter tolerances", {"BarConvTol": 1e-5, "FeasibilityTol": 1e-4}, False),
+    ("load shedding", {"NumericFocus": 3, "OptimalityTol": 1e-4}, True),
+    ("homogeneous barrier", {"BarHomogeneous": 1}, False),
+]
+
+
+def solve_with_fallbacks(n, attempts, status, condition, **kwargs):
+    """
+    Resolve the already built model with more robust settings after a failed
+    attempt.
+
+    The model is not rebuilt: only the solver options change or load shedding
+    variables are added. If the solver wrote a basis in the previous
+    attempt, it is used to warm-start the next one.
+    """
+    for name, solver_options, load_shedding in FALLBACK_LADDER:
+        if status == "ok":
+            break
+        logger.warning(
+            f"Solving status '{status}' with termination condition '{condition}'"
+        )
+        kwargs["solver_options"].update(solver_options)
+
+        start = time.time()
+        if load_shedding:
+            add_load_shedding_to_model(n)
+        build_time = time.time() - start
+
+        if kwargs.get("basis_fn") and os.path.exists(kwargs["basis_fn"]):
+            kwargs["warmstart_fn"] = kwargs["basis_fn"]
+
+        logger.warning(f"Rerun with {name} and solver settings '{kwargs}'")
+        status, condition = solve_model(n, attempts, name, build_time, **kwargs)
+
+    return status, condition
+
+
+def estimate_model_size(n):
+    """
+    Estimate the number of variables and constraints of the linear optimal
+    power flow without building the model.
+
+    Only dispatch and capacity variables with their bounds, the nodal balances,
+    storage balances and Kirchhoff voltage law are considered, not the
+    constraints of ``extra_functionality``.
+    """
+    nsns = len(n.snapshots)
+    # (component, capacity attribute, dispatch variables per snapshot, of
+    # which are bounded by the capacity)
+    components = [
+        ("Generator", "p_nom", 1, 1),
+        ("Link", "p_nom", 1, 1),
+        ("Line", "s_nom", 1, 1),
+        ("Transformer", "s_nom", 1, 1),
+        ("Store", "e_nom", 2, 1),
+        ("StorageUnit", "p_nom", 3, 3),
+    ]
+
+    estimate = {}
+    for c, attr, nvars, nbounded in components:
+        df = n.df(c)
+        if df.empty:
+            continue
+        ext = int(df[f"{attr}_extendable"].sum())
+        constraints = 2 * nsns * nbounded * len(df) + 2 * ext
+        if c in ["Store", "StorageUnit"]:
+            constraints += nsns * len(df)
+        estimate[c] = dict(
+            variables=nsns * nvars * len(df) + ext, constraints=constraints
+        )
+
+    # one cycle per branch beyond a spanning tree of the AC buses
+    branches = len(n.lines) + len(n.transformers)
+    cycles = max(branches - len(n.buses.query("carrier == 'AC'")) + 1, 0)
+    estimate["Bus"] = dict(variables=0, constraints=nsns * len(n.buses))
+    estimate["Kirchhoff-Voltage-Law"] = dict(variables=0, constraints=nsns * cycles)
+
+    estimate["total"] = {
+        k: sum(v[k] for v in estimate.values()) for k in ["variables", "constraints"]
+    }
+    return estimate
+
+
+def record_model_origins(n, origins):
+    """
+    Wrap the ``add_*`` functions of this module to record which variables and
+    constraints of the model each of them adds.
+
+    Returns the original functions, which can be restored with
+    ``globals().update(...)``.
+    """
+
+    def recording(name, func):
+        def wrapper(*args, **kwargs):
+            before = set(n.model.variables) | set(n.model.constraints)
+            result = func(*args, **kwargs)
+            added = (set(n.model.variables) | set(n.model.constraints)) - before
+            for key in added:
+                origins.setdefault(key, name)
+            return result
+
+        return wrapper
+
+    originals = {
+        name: func
+        for name, func in globals().items()
+        if name.startswith("add_")
+        and callable(func)
+        and getattr(func, "__module__", None) == __name__
+    }
+    globals().update({name: recording(name, f) for name, f in originals.items()})
+    return originals
+
+
+def model_size_report(n, config, solving):
+    """
+    Build the model including ``extra_functionality`` without solving it and
+    report its size.
+
+    Variables and constraints are broken down per component for the model
+    built by PyPSA and per function for the constraints added by
+    ``extra_functionality``. The analytical estimate of
+    :func:`estimate_model_size` is included for comparison, as are the
+    coefficient ranges of :func:`coefficient_ranges`.
+    """
+    cf_solving = solving["options"]
+    n.config = config
+
+    estimate = estimate_model_size(n)
+
+    start = time.time()
+    n.optimize.create_model(
+        multi_investment_periods=config["foresight"] == "perfect",
+        transmission_losses=cf_solving.get("transmission_losses", False),
+        linearized_unit_commitment=cf_solving.get("linearized_unit_commitment", False),
+    )
+    origins = {}
+    originals = record_model_origins(n, origins)
+    try:
+        extra_functionality(n, n.snapshots)
+    finally:
+        globals().update(originals)
+    build_time = time.time() - start
+
+    m = n.model
+    variables = {}
+    for name in m.variables:
+        labels = m.variables[name].labels
+        variables[name] = dict(
+            origin=origins.get(name, name.split("-")[0]),
+            count=int((labels != -1).sum()),
+        )
+    constraints = {}
+    for name in m.constraints:
+        con = m.constraints[name]
+        active = con.labels != -1
+        constraints[name] = dict(
+            origin=origins.get(name, name.split("-")[0]),
+            count=int(active.sum()),
+            nonzeros=int(((con.vars != -1) & active).sum()),
+        )
+
+    by_origin = {}
+    for kind, entries in [("variables", variables), ("constraints", constraints)]:
+        for entry in entries.values():
+            totals = by_origin.setdefault(
+                entry["origin"], dict(variables=0, constraints=0, nonzeros=0)
+            )
+            totals[kind] += entry["count"]
+            totals["nonzeros"] += entry.get("nonzeros", 0)
+
+    return dict(
+        snapshots=len(n.snapshots),
+        build_time=build_time,
+        total=dict(
+            variables=sum(v["count"] for v in variables.values()),
+            constraints=sum(c["count"] for c in constraints.values()),
+            nonzeros=sum(c["nonzeros"] for c in constraints.values()),
+        ),
+        by_origin=by_origin,
+        variables=variables,
+        constraints=constraints,
+        coefficient_ranges={
+            kind: df.droplevel(0).to_dict("index")
+            for kind, df in coefficient_ranges(m).dropna().groupby(level=0)
+        },
+        estimate=estimate,
+    )
+
+
+def get_checkpoint_key(network_fn, config, extra_functionality_fn=None):
+    """
+    Hash the input network, this script, the custom extra functionality and
+    the configuration except for the settings in ``CHECKPOINT_IGNORED``,
+    which do not change the built model.
+    """
+    solving = {
+        k: v for k, v in config["solving"].items() if k not in CHECKPOINT_IGNORED
+    }
+    solving["options"] = {
+        k: v for k, v in solving["options"].items() if k not in CHECKPOINT_IGNORED
+    }
+    digest = hashlib.sha256(get_file_hash(network_fn).encode())
+    digest.update(get_file_hash(__file__).encode())
+    if extra_functionality_fn:
+        digest.update(get_file_hash(extra_functionality_fn).encode())
+    digest.update(
+        json.dumps(config | dict(solving=solving), sort_keys=True, default=str).encode()
+    )
+    return digest.hexdigest()
+
+
+def read_checkpoint(n, checkpoint_dir, key):
+    """
+    Restore the built, and possibly solved, model of an interrupted solve.
+
+    Returns whether a checkpoint of the same network and configuration
+    was found.
+    """
+    fn = os.path.join(checkpoint_dir, "model.nc")
+    meta_fn = os.path.join(checkpoint_dir, "checkpoint.json")
+    if not (os.path.exists(fn) and os.path.exists(meta_fn)):
+        return False
+    with open(meta_fn) as f:
+        meta = json.load(f)
+    if meta["key"] != key:
+        logger.info("Discarding checkpoint of a different network or configuration.")
+        return False
+
+    logger.info(f"Restoring model checkpoint from {fn}")
+    n.model = linopy.read_netcdf(fn)
+    # linopy does not read back the parameters it writes
+    n.model.parameters = n.model.parameters.assign(snapshots=n.snapshots)
+    n._multi_invest = meta["multi_invest"]
+    n._linearized_uc = meta["linearized_uc"]
+    n.objective_constant = meta["objective_constant"]
+    return True
+
+
+def write_checkpoint(n, checkpoint_dir, key):
+    """
+    Write the built or solved model to the checkpoint directory.
+
+    The model of a solved checkpoint holds the primal and dual solution.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    fn = os.path.join(checkpoint_dir, "model.nc")
+    logger.info(f"Writing model checkpoint with status '{n.model.status}' to {fn}")
+
+    # an interrupted write must not corrupt the previous checkpoint
+    n.model.to_netcdf(fn + ".tmp")
+    os.replace(fn + ".tmp", fn)
+
+    meta = dict(
+        key=key,
+        status=n.model.status,
+        multi_invest=int(n._multi_invest),
+        linearized_uc=int(n._linearized_uc),
+        objective_constant=float(getattr(n, "objective_constant", 0.0)),
+    )
+    with open(os.path.join(checkpoint_dir, "checkpoint.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def solve_network(
+    n,
+    config,
+    solving,
+    attempts_fn=None,
+    checkpoint_dir=None,
+    checkpoint_key=None,
+    model_cache=None,
+    **kwargs,
+):
     set_of_options = solving["solver"]["options"]
     cf_solving = solving["options"]
 
     kwargs["multi_investment_periods"] = config["foresight"] == "perfect"
     kwargs["solver_options"] = (
-        solving["solver_options"][set_of_options] if set_of_options else {}
+        solving["solver_options"][set_of_options].copy() if set_of_options else {}
     )
     kwargs["solver_name"] = solving["solver"]["name"]
     kwargs["extra_functionality"] = extra_functionality
@@ -957,83 +1552,114 @@ def solve_network(n, config, solving, **kwargs):
 
     # add to network for extra_functionality
     n.config = config
-    
+
+    # keyword arguments for solving an already built model
+    solve_kwargs = {
+        k: kwargs[k]
+        for k in ["solver_name", "solver_options", "assign_all_duals", "io_api"]
+    }
+    if "log_fn" in kwargs:
+        solve_kwargs["log_fn"] = kwargs["log_fn"]
+    tmpdir = solving.get("tmpdir") or tempfile.gettempdir()
+    solve_kwargs["basis_fn"] = os.path.join(tmpdir, f"solve_network-{os.getpid()}.bas")
+    if checkpoint_dir is not None:
+        # keep the basis of the last attempt for a restarted solve
+        solve_kwargs["basis_fn"] = os.path.join(checkpoint_dir, "basis.bas")
+
+    attempts = []
     if rolling_horizon:
         kwargs["horizon"] = cf_solving.get("horizon", 365)
         kwargs["overlap"] = cf_solving.get("overlap", 0)
         n.optimize.optimize_with_rolling_horizon(**kwargs)
         status, condition = "", ""
     elif skip_iterations:
-        status, condition = n.optimize(**kwargs)
+        start = time.time()
+        restored = checkpoint_dir is not None and read_checkpoint(
+            n, checkpoint_dir, checkpoint_key
+        )
+        cache_dir = os.path.join(model_cache, checkpoint_key) if model_cache else None
+        cached = (
+            not restored
+            and cache_dir is not None
+            and read_checkpoint(n, cache_dir, checkpoint_key)
+        )
+        if not (restored or cached):
+            n.optimize.create_model(
+                multi_investment_periods=kwargs["multi_investment_periods"],
+                transmission_losses=kwargs["transmission_losses"],
+                linearized_unit_commitment=kwargs["linearized_unit_commitment"],
+            )
+            extra_functionality(n, n.snapshots)
+            # cache the unsolved model, whose solution depends on the solver options
+            if cache_dir is not None:
+                write_checkpoint(n, cache_dir, checkpoint_key)
+        if checkpoint_dir is not None and not restored:
+            write_checkpoint(n, checkpoint_dir, checkpoint_key)
+        build_time = time.time() - start
+        if cf_solving.get("report_coefficient_ranges", True):
+            log_coefficient_ranges(n)
+        initial_kwargs = solve_kwargs.copy()
+        if restored and os.path.exists(solve_kwargs["basis_fn"]):
+            initial_kwargs["warmstart_fn"] = solve_kwargs["basis_fn"]
+        if n.model.status == "ok":
+            logger.info("Checkpoint is already solved, skipping the solve.")
+            assign_solution(n)
+            assign_duals(n, kwargs["assign_all_duals"])
+            post_processing(n)
+            status, condition = "ok", "optimal"
+        else:
+            status, condition = solve_model(
+                n, attempts, "initial", build_time, **initial_kwargs
+            )
+            if status != "ok":
+                status, condition = solve_with_fallbacks(
+                    n, attempts, status, condition, **solve_kwargs
+                )
+            if status == "ok" and checkpoint_dir is not None:
+                write_checkpoint(n, checkpoint_dir, checkpoint_key)
     else:
         kwargs["track_iterations"] = (cf_solving.get("track_iterations", False),)
         kwargs["min_iterations"] = (cf_solving.get("min_iterations", 4),)
         kwargs["max_iterations"] = (cf_solving.get("max_iterations", 6),)
+        start = time.time()
         status, condition = n.optimize.optimize_transmission_expansion_iteratively(
             **kwargs
         )
-
-    if status != "ok" and not rolling_horizon:
-        logger.warning(
-            f"Solving status '{status}' with termination condition '{condition}'"
+        attempts.append(
+            dict(
+                attempt="initial",
+                build_time=None,
+                solve_time=time.time() - start,
+                status=status,
+                condition=condition,
+                solver_options=dict(kwargs["solver_options"]),
+            )
         )
-        kwargs["solver_options"]['BarConvTol'] = 1e-5
-        kwargs["solver_options"]['FeasibilityTol'] = 1e-4
-        # kwargs["solver_options"]['BarHomogeneous'] = 1
-        logger.warning(
-            f"Rerun with solver settings '{kwargs}'"
+
+    if status != "ok" and not rolling_horizon and not skip_iterations:
+        status, condition = solve_with_fallbacks(
+            n, attempts, status, condition, **solve_kwargs
         )
-        status, condition = n.optimize(**kwargs)
-        
-        if status != "ok" and not rolling_horizon:
-            logger.warning(
-                f"Solving status '{status}' with termination condition '{condition}'"
-            )
-            kwargs["solver_options"]['NumericFocus'] = 3
-            kwargs["solver_options"]['OptimalityTol'] = 1e-4
-            # kwargs["solver_options"]['BarHomogeneous'] = 1
-            
-            if not "load" in n.carriers.index:
-                n.add("Carrier", "load", color="#dd2e23", nice_name="Load shedding")
-            buses_i = n.buses.index.difference(n.generators[n.generators.carrier=="load"].bus)
 
-            # TODO: do not scale via sign attribute (use Eur/MWh instead of Eur/kWh)
-            load_shedding = 1e4  # Eur/kWh
-            if not buses_i.empty:
-                n.madd(
-                    "Generator",
-                    buses_i,
-                    " load",
-                    bus=buses_i,
-                    carrier="load",
-                    sign=1e-3,  # Adjust sign to measure p and p_nom in kW instead of MW
-                    marginal_cost=load_shedding,  # Eur/kWh
-                    p_nom=1e9,  # kW
-                )
-            
-            logger.warning(
-                f"Rerun with load shedding and solver settings '{kwargs}'"
-            )
-            status, condition = n.optimize(**kwargs)
-            
-            if status != "ok" and not rolling_horizon:
-                logger.warning(
-                    f"Solving status '{status}' with termination condition '{condition}'"
-                )
-                # kwargs["solver_options"]['NumericFocus'] = 3
-                kwargs["solver_options"]['BarHomogeneous'] = 1
-                logger.warning(
-                    f"Rerun with solver settings '{kwargs}'"
-                )
-                status, condition = n.optimize(**kwargs)
-                
-            
+    if status == "ok" and not rolling_horizon:
+        assign_load_shedding(n)
+
+    if checkpoint_dir is None or status == "ok":
+        if os.path.exists(solve_kwargs["basis_fn"]):
+            os.remove(solve_kwargs["basis_fn"])
+
+    if attempts_fn is not None:
+        with open(attempts_fn, "w") as f:
+            json.dump(attempts, f, indent=2)
+
     if "infeasible" in condition:
         labels = n.model.compute_infeasibilities()
         logger.info(f"Labels:\n{labels}")
         n.model.print_infeasibilities()
         raise RuntimeError("Solving status 'infeasible'")
 
+    restore_presolved_links(n)
+
     return n
 
 #%%
@@ -1059,7 +1685,7 @@ if __name__ == "__main__":
 
     np.random.seed(solve_opts.get("seed", 123))
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
 
     n = prepare_network(
         n,
@@ -1077,6 +1703,29 @@ if __name__ == "__main__":
     # to_drop = n.links[n.links.p_nom<5].loc[links_i].index
     # n.mremove("Link", to_drop)
     
+    if "model_size" in snakemake.output.keys():
+        report = model_size_report(
+            n, config=snakemake.config, solving=snakemake.params.solving
+        )
+        logger.info(f"Model size: {json.dumps(report['total'])}")
+        with open(snakemake.output.model_size, "w") as f:
+            json.dump(report, f, indent=2)
+        sys.exit(0)
+
+    checkpoint_dir = checkpoint_key = model_cache = None
+    results = os.path.dirname(os.path.dirname(snakemake.output.network))
+    if solve_opts.get("checkpoint", False):
+        name = os.path.splitext(os.path.basename(snakemake.output.network))[0]
+        checkpoint_dir = os.path.join(results, "checkpoints", name)
+    if solve_opts.get("model_cache", False):
+        model_cache = os.path.join(results, "model_cache")
+    if checkpoint_dir or model_cache:
+        checkpoint_key = get_checkpoint_key(
+            snakemake.input.network,
+            snakemake.config,
+            snakemake.params.custom_extra_functionality,
+        )
+
     with memory_logger(
         filename=getattr(snakemake.log, "memory", None), interval=30.0
     ) as mem:
@@ -1085,12 +1734,24 @@ if __name__ == "__main__":
             config=snakemake.config,
             solving=snakemake.params.solving,
             log_fn=snakemake.log.solver,
+            attempts_fn=getattr(snakemake.log, "attempts", None),
+            checkpoint_dir=checkpoint_dir,
+            checkpoint_key=checkpoint_key,
+            model_cache=model_cache,
         )
 
     logger.info(f"Maximum memory usage: {mem.mem_usage}")
 
     n.meta = dict(snakemake.config, **dict(wildcards=dict(snakemake.wildcards)))
-    n.export_to_netcdf(snakemake.output.network)
+    export_network(n, snakemake.output.network)
+
+    if "brownfield" in snakemake.output.keys():
+        export_brownfield_state(
+            n,
+            snakemake.output.brownfield,
+            int(snakemake.wildcards.planning_horizons),
+            renewable_carriers=snakemake.config["electricity"]["renewable_carriers"],
+        )
 
     with open(snakemake.output.config, "w") as file:
         yaml.dump(
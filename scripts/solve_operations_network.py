@@ -5,22 +5,259 @@
 """
 Solves linear optimal dispatch in hourly resolution using the capacities of
 previous capacity expansion in rule :mod:`solve_network`.
+
+If ``solving: operations: parallel`` is enabled, the year is split into
+windows of ``horizon`` snapshots, each extended by ``overlap`` snapshots,
+which are solved concurrently in ``processes`` processes. The dispatch of
+the overlapping snapshots is discarded when the windows are stitched
+together.
+
+Global constraints on sums over all snapshots, like CO2 limits, are scaled
+to each window by its share of the snapshot weightings. The threads of the
+rule are shared between the processes.
+
+The storage levels at the window boundaries are taken from a first solve of
+the whole year at the coarse resolution ``storage_resolution``. Each window
+starts at the level of this trajectory, and storage units and stores have
+to reach it again at the end of the window, so that seasonal storage is not
+depleted in every window. As the storage levels may jump at the window
+boundaries, the stitched dispatch approximates the dispatch of solving the
+whole year at once.
 """
 
 
+import copy
 import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
+import pandas as pd
 import pypsa
 from _helpers import (
     configure_logging,
+    export_network,
+    load_network,
     set_scenario_config,
     update_config_from_wildcards,
 )
-from solve_network import prepare_network, solve_network
+from solve_network import prepare_network, restore_presolved_links, solve_network
 
 logger = logging.getLogger(__name__)
 
+# global constraints on sums over all snapshots, which are scaled to windows
+ANNUAL_CONSTRAINT_TYPES = ["primary_energy", "operational_limit", "co2_atmosphere"]
+
+
+def coarsen_network(n, offset):
+    """
+    Average the time series of the network over periods of length ``offset``.
+    """
+    m = n.copy(with_time=False)
+
+    snapshot_weightings = n.snapshot_weightings.resample(offset).sum()
+    # skip empty periods, e.g. of dropped leap days
+    snapshot_weightings = snapshot_weightings[snapshot_weightings.objective > 0]
+    m.set_snapshots(snapshot_weightings.index)
+    m.snapshot_weightings = snapshot_weightings
+
+    for c in n.iterate_components():
+        pnl = getattr(m, c.list_name + "_t")
+        for k, df in c.pnl.items():
+            if not df.empty:
+                pnl[k] = df.resample(offset).mean().loc[snapshot_weightings.index]
+
+    return m
+
+
+def interpolate_levels(levels, initial, offset, instants):
+    """
+    Interpolate the storage levels of a coarse solve at the given instants.
+
+    The level of each coarse period is reached at its end, the initial
+    level at the start of the first period.
+    """
+    index = levels.index.shift(1, freq=offset).insert(0, levels.index[0])
+    levels = pd.concat([initial.to_frame().T, levels]).set_axis(index)
+    instants = pd.DatetimeIndex(instants)
+    return (
+        levels.reindex(levels.index.union(instants))
+        .interpolate(method="time", limit_direction="both")
+        .loc[instants]
+    )
+
+
+def storage_levels(n, m):
+    """
+    Return the levels of storage units and stores of the coarse solve ``m`` of
+    network ``n`` at the end of each coarse period and their initial levels.
+    """
+    su = n.storage_units
+    soc = m.storage_units_t.state_of_charge.reindex(columns=su.index)
+    su_initial = su.state_of_charge_initial.where(
+        ~su.cyclic_state_of_charge, soc.iloc[-1]
+    )
+    e = m.stores_t.e.reindex(columns=n.stores.index)
+    e_initial = n.stores.e_initial.where(~n.stores.e_cyclic, e.iloc[-1])
+    return soc, su_initial, e, e_initial
+
+
+def set_storage_boundaries(n, su_start, su_end, e_start, e_end):
+    """
+    Start storage units and stores of a window at the given levels and require
+    the given levels at the end of the window where they are not NaN.
+    """
+    last = n.snapshots[-1]
+
+    n.storage_units["cyclic_state_of_charge"] = False
+    n.storage_units["state_of_charge_initial"] = su_start
+    su_end = su_end.dropna()
+    soc_set = n.storage_units_t.state_of_charge_set
+    soc_set = soc_set.reindex(columns=soc_set.columns.union(su_end.index))
+    soc_set.loc[last, su_end.index] = su_end
+    n.storage_units_t.state_of_charge_set = soc_set
+
+    n.stores["e_cyclic"] = False
+    n.stores["e_initial"] = e_start
+    e_end = e_end.dropna()
+    e_nom = n.stores.e_nom.loc[e_end.index]
+    e_min_pu = n.get_switchable_as_dense("Store", "e_min_pu")
+    e_max_pu = n.get_switchable_as_dense("Store", "e_max_pu")
+    e_min_pu.loc[last, e_end.index] = np.minimum(
+        (e_end / e_nom.where(e_nom > 0)).fillna(0.0), e_max_pu.loc[last, e_end.index]
+    )
+    n.stores_t.e_min_pu = e_min_pu
+
+
+def scale_annual_constraints(n, share):
+    """
+    Scale the global constraints on sums over all snapshots to a window holding
+    ``share`` of the snapshot weightings.
+    """
+    glcs = n.global_constraints.index[
+        n.global_constraints.type.isin(ANNUAL_CONSTRAINT_TYPES)
+    ]
+    n.global_constraints.loc[glcs, "constant"] *= share
+
+
+def solve_window(ds, config, solving, log_fn):
+    """
+    Solve one window exported as dataset and return the solved window as
+    dataset.
+    """
+    n = pypsa.Network()
+    n.import_from_netcdf(ds)
+    n = solve_network(n, config=config, solving=solving, log_fn=log_fn)
+    if n.model.status != "ok":
+        raise RuntimeError(
+            f"Solving status '{n.model.status}' with termination condition "
+            f"'{n.model.termination_condition}'"
+        )
+    return n.export_to_netcdf()
+
+
+def solve_operations_in_parallel(n, config, solving, log_fn=None, threads=1):
+    """
+    Solve the dispatch of the network in overlapping windows in parallel and
+    write the stitched dispatch to the network.
+    """
+    operations = solving["operations"]
+    horizon = operations.get("horizon", 168)
+    overlap = operations.get("overlap", 24)
+    processes = min(operations.get("processes", threads), threads)
+    offset = operations.get("storage_resolution", "24h")
+
+    sns = n.snapshots
+    starts = range(0, len(sns), horizon)
+    windows = [(sns[i : i + horizon], sns[i : i + horizon + overlap]) for i in starts]
+
+    # share the threads of the rule between the processes
+    solving = copy.deepcopy(solving)
+    solving["options"]["rolling_horizon"] = False
+    set_of_options = solving["solver"]["options"]
+    solver_options = solving["solver_options"].get(set_of_options) or {}
+    # glpk has no threads option and runs single-threaded anyway
+    if solving["solver"]["name"] != "glpk":
+        solver_options["threads"] = max(threads // processes, 1)
+    solving["solver_options"][set_of_options] = solver_options
+
+    root, ext = os.path.splitext(log_fn) if log_fn else (None, None)
+    # fork, so that the workers inherit the rule parameters of solve_network
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        # the coarse solve runs in the pool as well, since solvers like HiGHS
+        # cannot be used in processes forked after they were started
+        logger.info(f"Solving storage trajectory at resolution {offset}.")
+        coarse = executor.submit(
+            solve_window,
+            coarsen_network(n, offset).export_to_netcdf(),
+            config,
+            copy.deepcopy(solving),
+            log_fn,
+        )
+        m = pypsa.Network()
+        m.import_from_netcdf(coarse.result())
+
+        # storage levels at the start and end of each window
+        su_levels, su_initial, e_levels, e_initial = storage_levels(n, m)
+        hours = n.snapshot_weightings.stores
+        ends = [w[-1] + pd.Timedelta(hours=hours[w[-1]]) for _, w in windows]
+        instants = pd.DatetimeIndex([w[0] for _, w in windows] + ends).unique()
+        su_levels = interpolate_levels(su_levels, su_initial, offset, instants)
+        e_levels = interpolate_levels(e_levels, e_initial, offset, instants)
+
+        weightings = n.snapshot_weightings.generators
+        futures = []
+        for i, (_, window) in enumerate(windows):
+            w = n.copy(snapshots=window)
+            scale_annual_constraints(w, weightings[window].sum() / weightings.sum())
+            last = i == len(windows) - 1
+            su_end = su_levels.loc[ends[i]]
+            e_end = e_levels.loc[ends[i]]
+            if last:
+                # the last window only keeps the cyclic condition
+                su_end = su_end.where(n.storage_units.cyclic_state_of_charge)
+                e_end = e_end.where(n.stores.e_cyclic)
+            set_storage_boundaries(
+                w, su_levels.loc[window[0]], su_end, e_levels.loc[window[0]], e_end
+            )
+            futures.append(
+                executor.submit(
+                    solve_window,
+                    w.export_to_netcdf(),
+                    config,
+                    copy.deepcopy(solving),
+                    f"{root}_window{i}{ext}" if log_fn else None,
+                )
+            )
+            logger.info(f"Submitted window {i + 1} of {len(windows)}.")
+
+        solved = []
+        for (kept, _), future in zip(windows, futures):
+            w = pypsa.Network()
+            w.import_from_netcdf(future.result())
+            solved.append((kept, w))
+
+    for c in n.iterate_components():
+        attrs = c.attrs.index[c.attrs.varying & (c.attrs.status == "Output")]
+        for attr in attrs:
+            frames = [
+                w.pnl(c.name)[attr].loc[kept]
+                for kept, w in solved
+                if not w.pnl(c.name)[attr].empty
+            ]
+            if frames:
+                c.pnl[attr] = pd.concat(frames).reindex(sns)
+
+    # the windows are solved without the links presolved in prepare_network
+    restore_presolved_links(n)
+
+    n.objective = n.statistics.opex().sum()
+
+    return n
+
 
 if __name__ == "__main__":
     if "snakemake" not in globals():
@@ -41,15 +278,31 @@ if __name__ == "__main__":
     set_scenario_config(snakemake)
     update_config_from_wildcards(snakemake.config, snakemake.wildcards)
 
-    solve_opts = snakemake.params.options
+    # extra_functionality of solve_network reads the rule parameters
+    sys.modules["solve_network"].snakemake = snakemake
+
+    solving = snakemake.params.solving
+    solve_opts = solving["options"]
 
     np.random.seed(solve_opts.get("seed", 123))
 
-    n = pypsa.Network(snakemake.input.network)
+    n = load_network(snakemake.input.network)
 
     n.optimize.fix_optimal_capacities()
     n = prepare_network(n, solve_opts, config=snakemake.config)
-    n = solve_network(n, config=snakemake.config, log_fn=snakemake.log.solver)
+
+    if solving.get("operations", {}).get("parallel", False):
+        n = solve_operations_in_parallel(
+            n,
+            config=snakemake.config,
+            solving=solving,
+            log_fn=snakemake.log.solver,
+            threads=snakemake.threads,
+        )
+    else:
+        n = solve_network(
+            n, config=snakemake.config, solving=solving, log_fn=snakemake.log.solver
+        )
 
     n.meta = dict(snakemake.config, **dict(wildcards=dict(snakemake.wildcards)))
-    n.export_to_netcdf(snakemake.output[0])
+    export_network(n, snakemake.output[0])